@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.dont_write_bytecode
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+import numpy as np
+from scipy.optimize import nnls
+# TOPOLOGIES
+from network_topologies.geant import Geant
+from network_topologies.topology import Topology
+from network_topologies.topology_compiler import compile_from_json, compile_topology, get_topology_dicts, load_compiled
+from network_topologies.topology_generator import generate_topology, generate_traffic_series, save_traffic_series
+# ROUTING ALGORITHMS
+from routing_algorithms.dijkstra import dijkstra
+from routing_algorithms.dijkstra import set_spt
+from routing_algorithms.ear import ear
+# SERVICES
+from service_flows.traffic_generator import TrafficGenerator
+import traffic_matrix_generator as tmg
+
+THIS_FILE_PATH = os.path.dirname(os.path.abspath(__file__))
+REPO_PATH = os.path.dirname(THIS_FILE_PATH)
+GEANT_TRAFFIC_PATH = os.path.join(REPO_PATH, 'service_flows', 'test_traffic')
+DEFAULT_OUTPUT = os.path.join(THIS_FILE_PATH, 'results.json')
+DEFAULT_BASELINE = os.path.join(THIS_FILE_PATH, 'baseline.json')
+
+DEFAULT_TOPOLOGIES = ['geant', 'pseudogeant', 'waxman:30', 'barabasi_albert:30']
+SERVICE_CLASSES = ['premium', 'assured', 'besteffort']
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    # TrafficGenerator writes its log file in the current working directory
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def time_call(function, repeat, setup=None):
+    """
+    Times 'function' 'repeat' times; 'setup' (if any) is called, untimed, before every run
+    and its return value is passed to 'function'.
+
+    Returns:
+        [dict]: min/median/mean execution time [s] and number of runs.
+    """
+
+    timings = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+
+    return {"min": min(timings), "median": statistics.median(timings), "mean": statistics.mean(timings), "repeat": repeat}
+
+
+class BenchmarkTopology:
+
+    def __init__(self, spec, seed, workdir, samples=3):
+        """
+        Initialization Method of BenchmarkTopology object: a topology under test and its traffic files.
+
+        Args:
+            spec (string): 'geant', 'pseudogeant' or '<family>:<n_nodes>' for a synthetic topology.
+            seed (int): random seed of synthetic topologies and traffic.
+            workdir (string): scratch folder (compiled topologies, synthetic traffic, logs).
+            samples (int, optional): number of synthetic traffic matrices. Defaults to 3.
+        """
+
+        self.spec = spec
+        self.seed = seed
+        self.workdir = os.path.join(workdir, spec.replace(':', '_'))
+        os.makedirs(self.workdir, exist_ok=True)
+        self._topologies = {}
+
+        if spec == 'geant':
+            self.traffic_path = GEANT_TRAFFIC_PATH
+            self.compiled_path = None
+        elif spec == 'pseudogeant':
+            self.compiled_path = compile_from_json('pseudogeant', source='metadata', \
+                                                   compiled_path=os.path.join(self.workdir, 'pseudogeant_compiled'))
+            self.traffic_path = self._save_traffic(*self._load_compiled(), samples)
+        else:
+            family, n_nodes = spec.split(':')
+            node_dict, link_dict = generate_topology(family, int(n_nodes), seed=seed)
+            self.compiled_path = os.path.join(self.workdir, 'topology_compiled')
+            compile_topology(spec.replace(':', '_'), node_dict, link_dict, self.compiled_path)
+            self.traffic_path = self._save_traffic(node_dict, link_dict, samples)
+
+    def _load_compiled(self):
+        _, node_dict, link_dict = get_topology_dicts(load_compiled(self.compiled_path))
+        return node_dict, link_dict
+
+    def _save_traffic(self, node_dict, link_dict, samples):
+        traffic_path = os.path.join(self.workdir, 'traffic')
+        save_traffic_series(generate_traffic_series(node_dict, link_dict, n_samples=samples, seed=self.seed), traffic_path)
+        return traffic_path
+
+    def new_topology(self, routing_method='Dijkstra'):
+        """
+        Returns a new Topology object (JSON autosave disabled, so that benchmarks never write in the repo).
+        """
+
+        if self.compiled_path is None:
+            topo = Geant(routing_method=routing_method)
+        else:
+            topo = Topology.from_compiled(self.compiled_path, routing_method=routing_method)
+        topo.autosave = False
+        return topo
+
+    def topology(self, routing_method='Dijkstra'):
+        """
+        Returns the (cached) Topology object routed with 'routing_method'.
+        """
+
+        if routing_method not in self._topologies:
+            self._topologies[routing_method] = self.new_topology(routing_method)
+        return self._topologies[routing_method]
+
+    def traffic_generator(self, topo):
+        """
+        Returns a TrafficGenerator (not started) on 'topo', logging into the scratch folder.
+        """
+
+        with working_directory(self.workdir):
+            return TrafficGenerator(interval=0, topology=topo, path=self.traffic_path, autostart=False)
+
+# ************ BENCHMARKS ************
+#
+# Every benchmark takes (BenchmarkTopology, repeat, seed) and returns a dict {benchmark name: timing}.
+
+def bench_dijkstra(bt, repeat, seed):
+    topo = bt.topology('Dijkstra')
+    root = topo.node_names[0]
+    return {"dijkstra": time_call(lambda: dijkstra(root, topo), repeat)}
+
+def bench_set_spt(bt, repeat, seed):
+    topo = bt.topology('Dijkstra')
+    return {"set_spt": time_call(lambda: set_spt(topo), repeat)}
+
+def bench_ear(bt, repeat, seed):
+    # EAR switches links off: it needs a fresh topology at every run
+    return {"ear": time_call(lambda topo: ear(topo, 2), repeat, setup=lambda: (bt.new_topology('Dijkstra'),))}
+
+def bench_init_mora(bt, repeat, seed):
+    topo = bt.topology('MORA')
+    return {"init_MORA": time_call(lambda: topo.init_MORA(max_hops=3, favored_attr='Power consumption'), repeat)}
+
+def bench_optimize_route(bt, repeat, seed, n_flows=5):
+    topo = bt.topology('MORA')
+    tg = bt.traffic_generator(topo)
+    rng = np.random.RandomState(seed)
+    pairs = [rng.choice(topo.node_names, size=2, replace=False) for _ in range(n_flows)]
+
+    results = {}
+    for service_class in SERVICE_CLASSES:
+        flows = [tg.get_flow(service_class=service_class, bandwidth=100.0, nodeA=a, nodeB=b) for a, b in pairs]
+
+        def route():
+            np.random.seed(seed)
+            for flow in flows:
+                topo.get_path(flow)
+
+        timing = time_call(route, repeat)
+        for key in ("min", "median", "mean"):
+            timing[key] /= n_flows  # per flow
+        results["optimize_route[{}]".format(service_class)] = timing
+
+    return results
+
+def _clear_network(tg):
+    for flow, path in tg.old_path_archive:
+        tg.topo.remove_service_from_network(flow, path)
+    tg.old_path_archive = []
+
+def bench_apply_flows(bt, repeat, seed):
+    topo = bt.topology('Dijkstra')
+    tg = bt.traffic_generator(topo)
+    flows = [tg.get_flows_from_file(i) for i in range(min(2, len(tg.traffic_files)))]
+
+    def setup_empty():
+        _clear_network(tg)
+        tg.flows = flows[0]
+        return ()
+
+    def setup_loaded():
+        setup_empty()
+        with working_directory(bt.workdir):
+            tg.apply_flows()
+        tg.flows = flows[-1]
+        return ()
+
+    def apply():
+        with working_directory(bt.workdir):
+            tg.apply_flows()
+
+    tables = [tg.get_flow_table(i) for i in range(len(flows))]
+
+    def apply_table():
+        with working_directory(bt.workdir):
+            tg.apply_flow_table(tables[-1][1], tables[-1][0])
+
+    results = {"apply_flows[empty]": time_call(apply, repeat, setup=setup_empty),
+               "apply_flows[update]": time_call(apply, repeat, setup=setup_loaded),
+               "apply_flow_table[update]": time_call(apply_table, repeat, setup=setup_loaded)}
+    _clear_network(tg)
+
+    return results
+
+def bench_log_stats(bt, repeat, seed):
+    topo = bt.topology('Dijkstra')
+    tg = bt.traffic_generator(topo)
+    tg.flows = tg.get_flows_from_file(0)
+
+    with working_directory(bt.workdir):
+        tg.apply_flows()
+        result = {"log_stats": time_call(tg.log_stats, repeat)}
+    _clear_network(tg)
+
+    return result
+
+def bench_nnls(bt, repeat, seed, samples=3):
+    topo = bt.topology('Dijkstra')
+    directed_links = topo.link_names
+    traffic_directions = tmg.generate_traffic_directions(topo.node_names)
+    A = np.array(tmg.generate_coefficient_matrix(directed_links, traffic_directions, topo))
+
+    if bt.spec == 'geant':
+        # Real dataset: link throughputs are read once from the CSV files, as in traffic_matrix_generator.main
+        _, B = tmg.load_link_throughputs(directed_links)
+        def get_b(t):
+            return B[t]
+    else:
+        # Synthetic traffic: link throughputs are obtained by routing the traffic matrices on the SPT
+        matrices = []
+        for f in sorted(os.listdir(bt.traffic_path))[:samples]:
+            tm = read_from_json(os.path.join(bt.traffic_path, f))
+            x = np.array([tm[d[:len(d)//2]][d[len(d)//2:]] for d in traffic_directions])
+            matrices.append(A.dot(x))
+        def get_b(t):
+            return matrices[t]
+
+    def nnls_loop():
+        for t in range(samples):
+            b = get_b(t)
+            solution, _ = nnls(A, b)
+            tmg.post_process_solution(solution)
+
+    def pgd_loop():
+        # Warm-started solver, single process
+        X = tmg.solve_traffic_matrices(A, [get_b(t) for t in range(samples)], workers=1, method='pgd')
+        for solution in X:
+            tmg.post_process_solution(solution)
+
+    def lbfgsb_loop():
+        # Sparse coefficient matrix, warm-started L-BFGS-B, single process
+        X = tmg.solve_traffic_matrices(A_sparse, [get_b(t) for t in range(samples)], workers=1, method='lbfgsb')
+        for solution in X:
+            tmg.post_process_solution(solution)
+
+    A_sparse = tmg.generate_sparse_coefficient_matrix(directed_links, traffic_directions, topo)
+    result = {}
+    for name, loop in (("nnls", nnls_loop), ("pgd", pgd_loop), ("lbfgsb", lbfgsb_loop)):
+        timing = time_call(loop, repeat)
+        for key in ("min", "median", "mean"):
+            timing[key] /= samples  # per timestamp
+        result["traffic_matrix_generator[{}]".format(name)] = timing
+
+    return result
+
+def read_from_json(json_path):
+    """
+    Returns data read from json file at found at 'json_path' location.
+    """
+
+    with open(json_path, 'r') as json_file:
+        data = json.load(json_file)
+
+    return data
+
+BENCHMARKS = {
+    "dijkstra": bench_dijkstra,
+    "set_spt": bench_set_spt,
+    "ear": bench_ear,
+    "init_MORA": bench_init_mora,
+    "optimize_route": bench_optimize_route,
+    "apply_flows": bench_apply_flows,
+    "log_stats": bench_log_stats,
+    "nnls": bench_nnls
+}
+
+# ************ RESULTS ************
+
+def compare(results, baseline, threshold):
+    """
+    Compares 'results' against 'baseline' (median times).
+
+    Args:
+        results (dict): current results.
+        baseline (dict): baseline results.
+        threshold (float): admitted slowdown (0.2 = 20%).
+
+    Returns:
+        [list]: names of the regressed benchmarks.
+    """
+
+    regressions = []
+    print("{:<55} {:>12} {:>12} {:>8}".format("BENCHMARK", "BASELINE [s]", "CURRENT [s]", "RATIO"))
+    for name in sorted(results):
+        if name not in baseline:
+            print("{:<55} {:>12} {:>12.6f} {:>8}".format(name, "-", results[name]["median"], "new"))
+            continue
+        ratio = results[name]["median"] / baseline[name]["median"]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = "  <-- REGRESSION"
+        print("{:<55} {:>12.6f} {:>12.6f} {:>8.2f}{}".format(name, baseline[name]["median"], results[name]["median"], ratio, flag))
+
+    return regressions
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of the simulator.')
+    parser.add_argument('--topologies', nargs='+', default=DEFAULT_TOPOLOGIES,
+                        help="'geant', 'pseudogeant' or '<family>:<n_nodes>' (synthetic)")
+    parser.add_argument('--benchmarks', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=64)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='results file (json)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file (json)')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='admitted slowdown w.r.t. the baseline')
+    args = parser.parse_args()
+
+    np.random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='mora_benchmarks_')
+    results = {}
+
+    try:
+        for spec in args.topologies:
+            bt = BenchmarkTopology(spec, args.seed, workdir)
+            for name in args.benchmarks:
+                print(" *** {} / {} *** ".format(spec, name))
+                for bench_name, timing in BENCHMARKS[name](bt, args.repeat, args.seed).items():
+                    results["{}/{}".format(spec, bench_name)] = timing
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat
+        },
+        "results": results
+    }
+
+    with open(args.output, 'w+') as f:
+        json.dump(report, f, sort_keys=True, indent=4)
+    print(" *** RESULTS SAVED TO {} *** ".format(args.output))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w+') as f:
+            json.dump(report, f, sort_keys=True, indent=4)
+        print(" *** BASELINE SAVED TO {} *** ".format(args.baseline))
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(" *** {} REGRESSION(S) ABOVE {}% *** ".format(len(regressions), int(100 * args.threshold)))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.dont_write_bytecode
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+import numpy as np
+# TOPOLOGIES
+from network_topologies.geant import Geant
+from network_topologies.topology import Topology
+# SERVICES
+from service_flows.traffic_generator import TrafficGenerator
+
+THIS_FILE_PATH = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATHS = [os.path.join(THIS_FILE_PATH, 'service_flows', 'experiments_{}'.format(k)) for k in (1, 2, 3)]
+DEFAULT_OUTPUT = os.path.join(THIS_FILE_PATH, 'Results_sweep')
+
+# Pristine topologies (routing precomputation done), built once per routing method by the parent process.
+# With the 'fork' start method every run gets its own copy, with no further precomputation.
+_TOPOLOGIES = {}
+
+
+def build_topology(topology, routing_method):
+    """
+    Returns a new topology routed with 'routing_method'.
+
+    Args:
+        topology (string): 'geant' or the location of a compiled topology (folder or .npz).
+        routing_method (string): 'Dijkstra', 'EAR' or 'MORA'.
+    """
+
+    if topology == 'geant':
+        topo = Geant(routing_method=routing_method)
+    else:
+        topo = Topology.from_compiled(topology, routing_method=routing_method)
+    # Parallel runs must not overwrite the topology DB
+    topo.autosave = False
+
+    return topo
+
+def get_cells(topology, methods, paths, boosts, faults, seeds, output, checkpoint_every=1):
+    """
+    Returns the configurations of the sweep (the cartesian product of the parameters).
+
+    Returns:
+        [list]: list of dict, one per run, with its log file and completion marker.
+    """
+
+    cells = []
+    for path, boost, n_faults, seed, method in itertools.product(paths, boosts, faults, seeds, methods):
+        dataset = os.path.basename(os.path.normpath(path))
+        run_dir = os.path.join(output, dataset, 'tb{}'.format(boost))
+        log_name = 'log_{}_f{}_s{}'.format(method, n_faults, seed)
+        cells.append({
+            "topology": topology,
+            "routing_method": method,
+            "path": path,
+            "traffic_boost": boost,
+            "faults": n_faults,
+            "seed": seed,
+            "checkpoint_every": checkpoint_every,
+            "log_file_name": os.path.join(run_dir, log_name + '.csv'),
+            "checkpoint": os.path.join(run_dir, log_name + '.ckpt'),
+            "marker": os.path.join(run_dir, log_name + '.done')
+        })
+
+    return cells
+
+def run_cell(cell):
+    """
+    Runs a single configuration of the sweep (fast-forward mode) and marks it as completed.
+    A run interrupted by a crash is resumed from its last checkpoint.
+
+    Returns:
+        [tuple]: (cell, error message or None, elapsed time [s]).
+    """
+
+    start = time.time()
+    try:
+        key = (cell['topology'], cell['routing_method'])
+        topo = _TOPOLOGIES.pop(key, None)
+        if topo is None:
+            topo = build_topology(*key)
+
+        random.seed(cell['seed'])
+        np.random.seed(cell['seed'])
+
+        os.makedirs(os.path.dirname(cell['log_file_name']), exist_ok=True)
+        resume_from = cell['checkpoint'] if os.path.exists(cell['checkpoint']) else None
+        tg = TrafficGenerator(interval=0, topology=topo, path=cell['path'], faults=cell['faults'], \
+                              traffic_boost=cell['traffic_boost'], autostart=False, mode='fast-forward', \
+                              log_file_name=cell['log_file_name'], checkpoint_path=cell['checkpoint'], \
+                              checkpoint_every=cell['checkpoint_every'], resume_from=resume_from)
+        tg.run()
+    except Exception as e:
+        return cell, repr(e), time.time() - start
+
+    elapsed = time.time() - start
+    with open(cell['marker'], 'w+') as f:
+        json.dump(dict(cell, elapsed=elapsed), f, sort_keys=True, indent=4)
+    if os.path.exists(cell['checkpoint']):
+        os.remove(cell['checkpoint'])
+
+    return cell, None, elapsed
+
+def run_sweep(cells, workers):
+    """
+    Runs the (not yet completed) cells on a pool of 'workers' processes.
+
+    Returns:
+        [list]: the failed cells, with their error messages.
+    """
+
+    todo = [c for c in cells if not os.path.exists(c['marker'])]
+    print(" *** {} RUNS, {} ALREADY COMPLETED *** ".format(len(cells), len(cells) - len(todo)))
+    if not todo:
+        return []
+
+    methods = multiprocessing.get_all_start_methods()
+    if 'fork' in methods:
+        # Shared precomputation: routing setup once per (topology, routing method), inherited by the workers
+        for key in sorted(set((c['topology'], c['routing_method']) for c in todo)):
+            _TOPOLOGIES[key] = build_topology(*key)
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+
+    failures = []
+    # One process per run: every run starts from the pristine topology
+    with context.Pool(processes=workers, maxtasksperchild=1) as pool:
+        for k, (cell, error, elapsed) in enumerate(pool.imap_unordered(run_cell, todo)):
+            status = 'FAILED ({})'.format(error) if error else 'DONE'
+            print(" *** [{}/{}] {} {} tb{} f{} s{}: {} in {:.1f} s *** ".format(k+1, len(todo), \
+                  cell['routing_method'], os.path.basename(os.path.normpath(cell['path'])), \
+                  cell['traffic_boost'], cell['faults'], cell['seed'], status, elapsed))
+            if error:
+                failures.append((cell, error))
+
+    return failures
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Run a grid of simulations on a process pool.')
+    parser.add_argument('--topology', default='geant', help="'geant' or a compiled topology (folder or .npz)")
+    parser.add_argument('--methods', nargs='+', default=['MORA', 'Dijkstra', 'EAR'])
+    parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS, help='traffic folders (or tensor files)')
+    parser.add_argument('--boosts', nargs='+', type=int, default=[0, 50, 100, 150])
+    parser.add_argument('--faults', nargs='+', type=int, default=[0])
+    parser.add_argument('--seeds', nargs='+', type=int, default=[64])
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--checkpoint-every', type=int, default=1, help='checkpoint period [iterations]')
+    args = parser.parse_args()
+
+    cells = get_cells(args.topology, args.methods, [os.path.abspath(p) for p in args.paths], \
+                      args.boosts, args.faults, args.seeds, os.path.abspath(args.output), args.checkpoint_every)
+    failures = run_sweep(cells, args.workers)
+
+    if failures:
+        print(" *** {} RUN(S) FAILED *** ".format(len(failures)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.dont_write_bytecode
+import numpy as np
+from scipy import sparse
+
+
+class IncidenceMatrix:
+
+    def __init__(self, link_names, capacity=256):
+        """
+        Initialization Method of IncidenceMatrix object.
+
+        The incidence matrix is a sparse (flows x links) binary matrix: the element a_fl is equal to 1
+        if flow f is routed over link l, and 0 otherwise. A dense vector holds the bandwidth of every flow.
+        Rows are patched one at a time when a flow is applied or removed; freed rows are recycled.
+
+        Arguments:
+            link_names {list} -- Ordered list of link ids (columns of the matrix).
+
+        Keyword Arguments:
+            capacity {int} -- Initial number of rows (default: {256}).
+        """
+
+        self.link_names = list(link_names)                               # column labels
+        self.link_index = {l: i for i, l in enumerate(self.link_names)}  # link id -> column index
+        self.flow_index = {}                                             # flow id -> row index
+        self.free_rows = []                                              # rows released by removed flows
+
+        self.matrix = sparse.lil_matrix((capacity, len(self.link_names)))  # flows x links
+        self.bandwidth = np.zeros(capacity)                                 # flow bandwidth [Mbps]
+        self._csr = None                                                    # cached CSR copy of 'matrix'
+
+    def __len__(self):
+        return len(self.flow_index)
+
+    def __contains__(self, flow_id):
+        return flow_id in self.flow_index
+
+    def _grow(self):
+        """
+        Double the number of rows of the matrix and of the bandwidth vector.
+        """
+
+        capacity = self.matrix.shape[0]
+        self.matrix.resize((2 * capacity, self.matrix.shape[1]))
+        self.bandwidth = np.concatenate((self.bandwidth, np.zeros(capacity)))
+        self.free_rows.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def _get_free_row(self):
+        if not self.free_rows and len(self.flow_index) >= self.matrix.shape[0]:
+            self._grow()
+        if self.free_rows:
+            return self.free_rows.pop()
+        return len(self.flow_index)
+
+    def path_to_columns(self, path):
+        """
+        Returns the sorted column indices of the links along 'path'.
+
+        Arguments:
+            path {list} -- Ordered list of nodes between flow source and destination.
+
+        Returns:
+            [list] -- Column indices of the links traversed by the path.
+        """
+
+        return sorted(self.link_index[path[i] + path[i+1]] for i in range(len(path)-1))
+
+    def add_flow(self, flow, path):
+        """
+        Add (or overwrite) the row of 'flow' routed along 'path'.
+
+        Arguments:
+            flow {dict} -- Service flow attributes.
+            path {list} -- Ordered list of nodes between flow source and destination.
+        """
+
+        flow_id = flow['_id']
+        row = self.flow_index.get(flow_id)
+        if row is None:
+            row = self._get_free_row()
+            self.flow_index[flow_id] = row
+
+        columns = self.path_to_columns(path) if path else []
+        self.matrix.rows[row] = columns
+        self.matrix.data[row] = [1.0] * len(columns)
+        self.bandwidth[row] = flow['bandwidth']
+        self._csr = None
+
+    def remove_flow(self, flow):
+        """
+        Clear the row of 'flow' and release it.
+
+        Arguments:
+            flow {dict} -- Service flow attributes.
+        """
+
+        row = self.flow_index.pop(flow['_id'], None)
+        if row is None:
+            return
+
+        self.matrix.rows[row] = []
+        self.matrix.data[row] = []
+        self.bandwidth[row] = 0.0
+        self.free_rows.append(row)
+        self._csr = None
+
+    def get_row(self, flow_id):
+        """
+        Returns the row index of flow 'flow_id' (None if the flow is not applied).
+        """
+
+        return self.flow_index.get(flow_id)
+
+    def get_flow_links(self, flow_id):
+        """
+        Returns the ids of the links traversed by flow 'flow_id'.
+        """
+
+        row = self.flow_index[flow_id]
+        return [self.link_names[c] for c in self.matrix.rows[row]]
+
+    def tocsr(self):
+        """
+        Returns a CSR copy of the incidence matrix, rebuilt only after a row has been patched.
+        """
+
+        if self._csr is None:
+            self._csr = self.matrix.tocsr()
+        return self._csr
+
+    # ************ CHECKPOINT ************
+
+    def get_state(self):
+        """
+        Returns the row layout of the matrix (rows can be refilled from the flow paths, see set_state).
+        """
+
+        return {"capacity": self.matrix.shape[0], "flow_index": dict(self.flow_index), "free_rows": list(self.free_rows)}
+
+    def set_state(self, state, flows):
+        """
+        Rebuilds the matrix with the row layout 'state' (see get_state).
+
+        Arguments:
+            state {dict} -- Row layout.
+            flows {dict} -- (flow, path) tuple of every flow in the layout, indexed by flow id.
+        """
+
+        self.matrix = sparse.lil_matrix((state["capacity"], len(self.link_names)))
+        self.bandwidth = np.zeros(state["capacity"])
+        self.flow_index = {}
+        self.free_rows = list(state["free_rows"])
+        self._csr = None
+
+        for flow_id, row in state["flow_index"].items():
+            flow, path = flows[flow_id]
+            self.flow_index[flow_id] = row
+            columns = self.path_to_columns(path) if path else []
+            self.matrix.rows[row] = columns
+            self.matrix.data[row] = [1.0] * len(columns)
+            self.bandwidth[row] = flow['bandwidth']
+
+    # ************ MATRIX-VECTOR PRODUCTS ************
+
+    def link_loads(self):
+        """
+        Returns the bandwidth [Mbps] coupled to every link: A^T * bw.
+        """
+
+        return self.tocsr().T.dot(self.bandwidth)
+
+    def link_flow_counts(self):
+        """
+        Returns the number of flows coupled to every link: A^T * 1.
+        """
+
+        csr = self.tocsr()
+        return np.asarray(csr.sum(axis=0)).ravel().astype(int)
+
+    def flow_hops(self):
+        """
+        Returns the number of hops of every row: A * 1.
+        """
+
+        return np.diff(self.tocsr().indptr)
+
+    def flow_latencies(self, link_latencies):
+        """
+        Returns the end-to-end latency of every row: A * lat.
+
+        Arguments:
+            link_latencies {np.ndarray} -- Latency of every link [ms].
+        """
+
+        return self.tocsr().dot(link_latencies)
+
+    def flow_violations(self, link_usages, threshold=1.0):
+        """
+        Returns True for every row traversing at least one link whose usage is above 'threshold'.
+
+        Arguments:
+            link_usages {np.ndarray} -- Usage of every link (1.0 = 100%).
+
+        Keyword Arguments:
+            threshold {float} -- Usage threshold (default: {1.0}).
+        """
+
+        congested = (np.asarray(link_usages) > threshold).astype(float)
+        return self.tocsr().dot(congested) > 0
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.dont_write_bytecode
+import numpy as np
+
+# Default link power model parameters.
+# See paper IEEE "A Hop-by-Hop Routing Mechanism for Green Internet"
+DELTA = 180     # idle power
+RHO = 5e-4      # linear coefficient
+MU = 1e-03      # non-linear coefficient
+ALPHA = 1.4     # non-linear exponent
+N_L = 1         # number of physical links
+
+
+class PowerModel:
+
+    def __init__(self, capacities, delta=DELTA, rho=RHO, mu=MU, alpha=ALPHA, n_l=N_L):
+        """
+        Initialization Method of PowerModel object.
+
+        The power consumed by link l carrying x Mbps is
+            P_l(x) = 2 * n_l * (delta + rho * x/n_l + mu * (x/n_l)**alpha)   if x > 0
+            P_l(x) = 0                                                       otherwise
+        where x is capped to the link capacity.
+        Every parameter can be a scalar (same hardware on every link) or an array with one value per link.
+
+        Arguments:
+            capacities {array} -- Capacity [Mbps] of every link.
+
+        Keyword Arguments:
+            delta {float or array} -- Idle power (default: {DELTA}).
+            rho {float or array} -- Linear coefficient (default: {RHO}).
+            mu {float or array} -- Non-linear coefficient (default: {MU}).
+            alpha {float or array} -- Non-linear exponent (default: {ALPHA}).
+            n_l {float or array} -- Number of physical links (default: {N_L}).
+        """
+
+        self.capacities = np.asarray(capacities, dtype=float)
+        n_links = len(self.capacities)
+
+        # Per-link parameters
+        self.delta = np.broadcast_to(np.asarray(delta, dtype=float), (n_links,)).copy()
+        self.rho = np.broadcast_to(np.asarray(rho, dtype=float), (n_links,)).copy()
+        self.mu = np.broadcast_to(np.asarray(mu, dtype=float), (n_links,)).copy()
+        self.alpha = np.broadcast_to(np.asarray(alpha, dtype=float), (n_links,)).copy()
+        self.n_l = np.broadcast_to(np.asarray(n_l, dtype=float), (n_links,)).copy()
+
+        # Lookup table (see build_table)
+        self.table = None
+        self.table_step = None
+
+    @classmethod
+    def from_links(cls, links, **params):
+        """
+        Returns the PowerModel of a list of Link objects.
+
+        Arguments:
+            links {list} -- List of Link objects.
+            **params -- Model parameters, scalars or arrays ordered as 'links'.
+        """
+
+        return cls([link.total_bandwidth for link in links], **params)
+
+    def _evaluate(self, link_idx, x):
+        # Power consumed by links 'link_idx' carrying 'x' Mbps, assuming x > 0
+        x = np.minimum(x, self.capacities[link_idx])
+        n_l = self.n_l[link_idx]
+        x_n = x / n_l
+        return 2 * n_l * (self.delta[link_idx] + self.rho[link_idx] * x_n + self.mu[link_idx] * x_n ** self.alpha[link_idx])
+
+    def power(self, link_idx, loads):
+        """
+        Returns the power consumed by links 'link_idx' carrying 'loads' Mbps.
+
+        Arguments:
+            link_idx {array} -- Link indices.
+            loads {array} -- Bandwidth [Mbps] carried by each link.
+
+        Returns:
+            [np.ndarray] -- Power consumption of each link.
+        """
+
+        link_idx = np.asarray(link_idx, dtype=int)
+        loads = np.asarray(loads, dtype=float)
+
+        return np.where(loads > 0, self._evaluate(link_idx, np.maximum(loads, 0.0)), 0.0)
+
+    def marginal_power(self, link_idx, loads, extra, use_table=False):
+        """
+        Returns the additional power consumed by links 'link_idx' when 'extra' Mbps are added to 'loads'.
+
+        Arguments:
+            link_idx {array} -- Link indices.
+            loads {array} -- Bandwidth [Mbps] currently carried by each link.
+            extra {float or array} -- Additional bandwidth [Mbps].
+
+        Keyword Arguments:
+            use_table {bool} -- Interpolate on the lookup table instead of evaluating the model (default: {False}).
+
+        Returns:
+            [np.ndarray] -- Marginal power of each link.
+        """
+
+        loads = np.asarray(loads, dtype=float)
+        evaluate = self.interpolate if use_table else self.power
+
+        return evaluate(link_idx, loads + extra) - evaluate(link_idx, loads)
+
+    # ************ LOOKUP TABLE ************
+
+    def build_table(self, resolution=1024):
+        """
+        Precompute, for every link, the model over 'resolution' equally spaced loads between 0 and its capacity.
+
+        Keyword Arguments:
+            resolution {int} -- Number of samples per link (default: {1024}).
+        """
+
+        grid = np.linspace(0.0, 1.0, resolution)
+        loads = self.capacities[:, None] * grid[None, :]
+        link_idx = np.repeat(np.arange(len(self.capacities))[:, None], resolution, axis=1)
+
+        # The idle term is kept at x = 0 too, so that interpolation is exact near zero;
+        # unloaded links are masked in interpolate().
+        self.table = self._evaluate(link_idx, loads)
+        self.table_step = self.capacities / (resolution - 1)
+
+    def interpolate(self, link_idx, loads):
+        """
+        Returns the power consumed by links 'link_idx' carrying 'loads' Mbps,
+        linearly interpolated on the lookup table (built on first use).
+
+        Arguments:
+            link_idx {array} -- Link indices.
+            loads {array} -- Bandwidth [Mbps] carried by each link.
+
+        Returns:
+            [np.ndarray] -- Power consumption of each link.
+        """
+
+        if self.table is None:
+            self.build_table()
+
+        link_idx = np.asarray(link_idx, dtype=int)
+        loads = np.asarray(loads, dtype=float)
+        x = np.clip(loads, 0.0, self.capacities[link_idx])
+
+        position = x / self.table_step[link_idx]
+        lower = np.minimum(position.astype(int), self.table.shape[1] - 2)
+        fraction = position - lower
+        values = self.table[link_idx, lower] * (1 - fraction) + self.table[link_idx, lower + 1] * fraction
+
+        return np.where(loads > 0, values, 0.0)
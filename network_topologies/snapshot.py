@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.dont_write_bytecode
+import numpy as np
+from routing_algorithms.mora_v2 import eval_bandwidth_links
+
+
+class TopologySnapshot:
+
+    def __init__(self, parent):
+        """
+        Initialization Method of TopologySnapshot object.
+
+        A snapshot is a copy-on-write overlay of the operational link state (consumed bandwidth and status)
+        of a Topology, or of another snapshot. Reads fall through to the parent until a link is written;
+        writes only touch the overlay. Tentative changes can then be committed to the parent or discarded.
+
+        N.B. Links that have not been written in the overlay reflect the current state of the parent.
+
+        Arguments:
+            parent {Topology or TopologySnapshot} -- State to be forked.
+        """
+
+        self.parent = parent
+        if isinstance(parent, TopologySnapshot):
+            self.topology = parent.topology
+        else:
+            self.topology = parent
+
+        self._loads = {}        # link index -> consumed bandwidth [Mbps] (written links only)
+        self._statuses = {}     # link index -> status (written links only)
+        self._flows = {}        # flow id -> (flow, path) tentatively applied
+        self._removed = {}      # flow id -> (flow, path) tentatively removed
+        self._nodes_off = set() # nodes tentatively shut down
+        self.operations = []    # ordered list of tentative operations, replayed by commit()
+
+    def snapshot(self):
+        """
+        Returns a copy-on-write snapshot of this snapshot (nested what-if analyses).
+        """
+
+        return TopologySnapshot(self)
+
+    # ************ READ ************
+
+    def get_link_load(self, link_idx):
+        """
+        Returns the consumed bandwidth [Mbps] of link 'link_idx' as seen by this snapshot.
+        """
+
+        if link_idx in self._loads:
+            return self._loads[link_idx]
+        if isinstance(self.parent, TopologySnapshot):
+            return self.parent.get_link_load(link_idx)
+        return self.topology.links[link_idx].consumed_bandwidth
+
+    def get_link_status(self, link_idx):
+        """
+        Returns the status ('on'/'off') of link 'link_idx' as seen by this snapshot.
+        """
+
+        if link_idx in self._statuses:
+            return self._statuses[link_idx]
+        if isinstance(self.parent, TopologySnapshot):
+            return self.parent.get_link_status(link_idx)
+        return self.topology.links[link_idx].status
+
+    def get_node_status(self, node_name):
+        """
+        Returns the status ('on'/'off') of node 'node_name' as seen by this snapshot.
+        """
+
+        if node_name in self._nodes_off:
+            return 'off'
+        if isinstance(self.parent, TopologySnapshot):
+            return self.parent.get_node_status(node_name)
+        return self.topology.get_one_node(node_name).status
+
+    def get_link_flows(self, link_idx):
+        """
+        Returns the ids of the flows coupled to link 'link_idx' as seen by this snapshot.
+        """
+
+        if self.get_link_status(link_idx) == 'off':
+            return set()
+
+        if isinstance(self.parent, TopologySnapshot):
+            flow_ids = self.parent.get_link_flows(link_idx)
+        else:
+            flow_ids = set(self.topology.links[link_idx].service_flows)
+        flow_ids.difference_update(self._removed)
+
+        link_name = self.topology.link_names[link_idx]
+        for flow_id, (_, path) in self._flows.items():
+            if any(path[i] + path[i+1] == link_name for i in range(len(path)-1)):
+                flow_ids.add(flow_id)
+
+        return flow_ids
+
+    def get_link_loads(self):
+        """
+        Returns the consumed bandwidth [Mbps] of every link, ordered as 'link_names'.
+        """
+
+        if isinstance(self.parent, TopologySnapshot):
+            loads = self.parent.get_link_loads()
+        else:
+            loads = np.array([link.consumed_bandwidth for link in self.topology.links], dtype=float)
+        for link_idx, load in self._loads.items():
+            loads[link_idx] = load
+
+        return loads
+
+    def get_link_statuses(self):
+        """
+        Returns a boolean array, True for every active link, ordered as 'link_names'.
+        """
+
+        if isinstance(self.parent, TopologySnapshot):
+            statuses = self.parent.get_link_statuses()
+        else:
+            statuses = np.array([link.status == 'on' for link in self.topology.links])
+        for link_idx, status in self._statuses.items():
+            statuses[link_idx] = (status == 'on')
+
+        return statuses
+
+    def get_link_usages(self):
+        # Return the list of link percentage usage over all the network
+        return self.get_link_loads() / self.topology.power_model.capacities
+
+    def get_power_consumption(self):
+        # Return the overall power consumption of the network
+        loads = self.get_link_loads()
+        active = np.flatnonzero(self.get_link_statuses())
+        return np.sum(self.topology.power_model.power(active, loads[active]))
+
+    def get_reliability_score(self):
+        # Return the max reliability score (for the most used link)
+        # and the number of links above the reliability threshold
+        active = self.get_link_statuses()
+        reliabilities = eval_bandwidth_links(self.get_link_usages()[active])
+        return np.max(reliabilities), int(np.sum(reliabilities > 0.6))
+
+    def get_applied_flows(self):
+        """
+        Returns the flows tentatively applied on this snapshot (not yet committed).
+
+        Returns:
+            [list] -- List of (flow, path) tuples.
+        """
+
+        return list(self._flows.values())
+
+    # ************ WRITE ************
+
+    def _consume_bandwidth(self, link_idx, bandwidth):
+        load = self.get_link_load(link_idx) + float(bandwidth)
+        if load < -1e-3:
+            load = 0.0
+        self._loads[link_idx] = load
+
+    def apply_service_on_network(self, service_flow, path):
+        """
+        Tentatively applies a service flow on the links along the path.
+
+        Args:
+            service_flow (dict): service flow attributes.
+            path (list): list of nodes between flow source and destination.
+        """
+
+        for link_idx in self.topology.get_link_indices(path):
+            if self.get_link_status(link_idx) == 'on':
+                self._consume_bandwidth(link_idx, service_flow['bandwidth'])
+
+        self._flows[service_flow['_id']] = (service_flow, path)
+        self.operations.append(('apply', service_flow, path))
+
+    def remove_service_from_network(self, service_flow, path):
+        """
+        Tentatively removes a service flow from the links along the path.
+
+        Args:
+            service_flow (dict): service flow attributes.
+            path (list): list of nodes between flow source and destination.
+        """
+
+        for link_idx in self.topology.get_link_indices(path):
+            if self.get_link_status(link_idx) == 'on':
+                self._consume_bandwidth(link_idx, -service_flow['bandwidth'])
+
+        if self._flows.pop(service_flow['_id'], None) is None:
+            self._removed[service_flow['_id']] = (service_flow, path)
+        self.operations.append(('remove', service_flow, path))
+
+    def switch_off_link(self, link_name):
+        """
+        Tentatively switches off a link: its consumed bandwidth is erased.
+        Links already switched off are ignored.
+
+        Args:
+            link_name (string): link id.
+        """
+
+        link_idx = self.topology.incidence.link_index[link_name]
+        if self.get_link_status(link_idx) == 'off':
+            return
+        self._switch_off(link_idx)
+        self.operations.append(('switch_off', link_name, None))
+
+    def _switch_off(self, link_idx):
+        self._statuses[link_idx] = 'off'
+        self._loads[link_idx] = 0.0
+
+    def shutdown_node(self, node_name):
+        """
+        Tentatively shuts down a node, i.e. all its active links.
+
+        Args:
+            node_name (string): node name.
+
+        Returns:
+            [list]: list of flow ids disrupted by the shut down links.
+        """
+
+        topo = self.topology
+        link_indices = [topo.incidence.link_index[l] for l in topo.get_one_node(node_name).links_list]
+        link_indices = [i for i in link_indices if self.get_link_status(i) == 'on']
+
+        # Flows coupled to the links in the parent chain or tentatively applied on this snapshot
+        disrupted_flows_ids = set()
+        for link_idx in link_indices:
+            disrupted_flows_ids.update(self.get_link_flows(link_idx))
+            self._switch_off(link_idx)
+
+        self._nodes_off.add(node_name)
+        self.operations.append(('shutdown_node', node_name, None))
+
+        return list(disrupted_flows_ids)
+
+    # ************ COMMIT/DISCARD ************
+
+    def commit(self):
+        """
+        Replays the tentative operations on the parent and empties this snapshot.
+
+        Flows are applied/removed (in their order) before links and nodes are switched off (in their order):
+        switching off a link drops its flows on a Topology, so a disrupted flow removed on the snapshot
+        could not be removed from it afterwards. The final link state is the same as in the snapshot.
+
+        Raises:
+            Exception: the parent Topology does not accept the operations (e.g. a flow removed
+                from a link it is not coupled to); nothing is replayed.
+        """
+
+        parent = self.parent
+        operations = [op for op in self.operations if op[0] in ('apply', 'remove')] + \
+                     [op for op in self.operations if op[0] not in ('apply', 'remove')]
+        if not isinstance(parent, TopologySnapshot):
+            self.check_operations(operations)
+
+        for operation, item, path in operations:
+            if operation == 'apply':
+                parent.apply_service_on_network(item, path)
+            elif operation == 'remove':
+                parent.remove_service_from_network(item, path)
+            elif operation == 'shutdown_node':
+                parent.shutdown_node(item)
+            elif isinstance(parent, TopologySnapshot):
+                parent.switch_off_link(item)
+            else:
+                parent.switch_off_link(parent.get_one_link(item))
+
+        self.discard()
+
+    def check_operations(self, operations):
+        """
+        Dry run of 'operations' on the parent Topology, which is not modified.
+
+        Arguments:
+            operations {list} -- Ordered list of (operation, flow/link/node, path).
+
+        Raises:
+            Exception: an operation would fail on the parent Topology.
+        """
+
+        topo = self.parent
+        current_flows = {}  # flow id -> number of times in current_flows
+        for flow in topo.current_flows:
+            current_flows[flow['_id']] = current_flows.get(flow['_id'], 0) + 1
+        link_flows = {}     # link index -> {flow id: count}, for the links touched only
+        statuses = {}       # link index -> status, for the links touched only
+
+        def get_link_flows(link_idx):
+            if link_idx not in link_flows:
+                link_flows[link_idx] = {}
+                for flow_id in topo.links[link_idx].service_flows:
+                    link_flows[link_idx][flow_id] = link_flows[link_idx].get(flow_id, 0) + 1
+            return link_flows[link_idx]
+
+        def switch_off(link_idx):
+            if statuses.get(link_idx, topo.links[link_idx].status) == 'off':
+                raise Exception('*** CANNOT COMMIT: LINK {} IS ALREADY SWITCHED OFF ***'.format(topo.link_names[link_idx]))
+            statuses[link_idx] = 'off'
+            link_flows[link_idx] = {}
+
+        for operation, item, path in operations:
+            if operation == 'apply':
+                current_flows[item['_id']] = current_flows.get(item['_id'], 0) + 1
+                for link_idx in topo.get_link_indices(path):
+                    flows = get_link_flows(link_idx)
+                    flows[item['_id']] = flows.get(item['_id'], 0) + 1
+            elif operation == 'remove':
+                if not current_flows.get(item['_id']):
+                    raise Exception('*** CANNOT COMMIT: FLOW {} IS NOT APPLIED ***'.format(item['_id']))
+                current_flows[item['_id']] -= 1
+                for link_idx in topo.get_link_indices(path):
+                    flows = get_link_flows(link_idx)
+                    if not flows.get(item['_id']):
+                        raise Exception('*** CANNOT COMMIT: FLOW {} IS NOT ON LINK {} ***'.format(item['_id'], topo.link_names[link_idx]))
+                    flows[item['_id']] -= 1
+            elif operation == 'shutdown_node':
+                for link_name in topo.get_one_node(item).links_list:
+                    link_idx = topo.incidence.link_index[link_name]
+                    if statuses.get(link_idx, topo.links[link_idx].status) == 'on':
+                        switch_off(link_idx)
+            else:
+                switch_off(topo.incidence.link_index[item])
+
+    def discard(self):
+        """
+        Drops every tentative operation.
+        """
+
+        self._loads = {}
+        self._statuses = {}
+        self._flows = {}
+        self._removed = {}
+        self._nodes_off = set()
+        self.operations = []
@@ -14,6 +14,15 @@ from routing_algorithms.dijkstra import dijkstra_cost
 from routing_algorithms.dijkstra import set_spt
 # EAR
 from routing_algorithms.ear import ear
+# FLOW-LINK INCIDENCE MATRIX
+from .incidence import IncidenceMatrix
+# LINK POWER MODEL
+from . import power_model
+from .power_model import PowerModel
+# COPY-ON-WRITE SNAPSHOTS
+from .snapshot import TopologySnapshot
+# COMPILED TOPOLOGIES
+from .topology_compiler import LINK_FIELDS, get_node_adjacency, get_node_pops, get_reachability, load_compiled
 
 
 def write_to_json(data, filename, json_path):
@@ -47,6 +56,47 @@ class Topology:
         N.B. There are no consistency checks between input node_dict and input link_dict.
         """
 
+        self.init_attributes(name)
+        
+        # Create this Topology nodes and links 
+        self.create_topology(node_dict, link_dict)
+        self.reset()
+
+        self.init_state(routing_method)
+
+    @classmethod
+    def from_compiled(cls, compiled_path, routing_method = 'Dijkstra'):
+        """
+        Creates a Topology from a compiled topology (see topology_compiler.py).
+
+        Nodes and links are built straight from the (memory-mapped) arrays, and the reachability
+        matrix of the fresh topology is computed from them.
+
+        Arguments:
+            compiled_path {str} -- Location of the compiled folder (or .npz file).
+
+        Keyword Arguments:
+            routing_method {str} -- Name of the routing method (default: {'Dijkstra'}).
+
+        Returns:
+            [Topology] -- Topology object (of class 'cls').
+        """
+
+        arrays = load_compiled(compiled_path)
+
+        # Subclasses (e.g. Geant) read their own JSON files in __init__: bypass it
+        topo = cls.__new__(cls)
+        topo.init_attributes(str(arrays['name']))
+        topo.create_compiled_topology(arrays)
+        topo.init_state(routing_method, reachability_matrix=get_reachability(arrays))
+
+        return topo
+
+    def init_attributes(self, name):
+        """
+        Initializes the attributes of an empty Topology named 'name'.
+        """
+
         self.name = name            # this Topology name
         self.nodes=[]               # list of Node objects belonging to this Topology
         self.links=[]               # list of Link objects belonging to this Topology
@@ -56,13 +106,30 @@ class Topology:
         self.link_dict = {}         # dictionary of links and links' properties
         self.current_flows = []     # list of currently applied flows on this Topology
         self.faulty_node_list = []  # list of faulty nodes
-        
-        # Create this Topology nodes and links 
-        self.create_topology(node_dict, link_dict)
-        self.reset()
+        self.autosave = True        # save topology info (json) after every service change
+        self.instrumentation = None # Instrumentation object (see utils/instrumentation.py), None if disabled
+
+    def init_state(self, routing_method, reachability_matrix=None):
+        """
+        Initializes the link attributes, the reachability matrix and the routing method of the created nodes and links.
+
+        Arguments:
+            routing_method {str} -- Name of the routing method.
+
+        Keyword Arguments:
+            reachability_matrix {list} -- Reachability Matrix, computed if None (default: {None}).
+        """
+
+        # Flow-link incidence matrix (flows x links) and static link attributes
+        self.incidence = IncidenceMatrix(self.link_names)
+        self.link_latencies = np.array([link.latency for link in self.links], dtype=float)
+        self.path_latencies = {}    # flow id -> mean link latency along its path [ms], cached when applied
+        self.power_model = PowerModel.from_links(self.links)
 
         # Setup routing method
-        self.reachability_matrix = self.get_reachability_matrix()  # this Topology reachability matrix
+        if reachability_matrix is None:
+            reachability_matrix = self.get_reachability_matrix()
+        self.reachability_matrix = reachability_matrix  # this Topology reachability matrix
         self.routing_method = routing_method
         self.init_routing_method(routing_method)
 
@@ -84,6 +151,30 @@ class Topology:
         for link_info in link_dict:
             self.create_link(info=link_dict[link_info])
 
+    def create_compiled_topology(self, arrays):
+        """
+        Create nodes and links from the arrays of a compiled topology (see topology_compiler.py).
+        Nodes and links are created 'on', with no flows: no reset is needed.
+
+        Arguments:
+            arrays {dict} -- Compiled topology (see load_compiled).
+        """
+
+        # Create nodes
+        self.node_names = arrays['node_names'].tolist()
+        self.nodes = [Node({"_id": name, "pop": pop, "links": links, "neighbors": neighbors}) \
+                      for name, pop, links, neighbors in zip(self.node_names, get_node_pops(arrays), \
+                          get_node_adjacency(arrays, 'links'), get_node_adjacency(arrays, 'neighbors'))]
+        self.node_dict = {'node{}'.format(i + 1): node.info for i, node in enumerate(self.nodes)}
+
+        # Create links
+        fields = ["_id", "node1", "node2"] + list(LINK_FIELDS)
+        columns = [arrays[key].tolist() for key in ('link_names', 'link_node1', 'link_node2')] + \
+                  [arrays['link_' + field].tolist() for field in LINK_FIELDS]
+        self.links = [Link(dict(zip(fields, row))) for row in zip(*columns)]
+        self.link_names = [link.id for link in self.links]
+        self.link_dict = {'link{}'.format(i + 1): link.info for i, link in enumerate(self.links)}
+
     def reset(self):
         """
         Resets all topology nodes and links status.
@@ -129,6 +220,8 @@ class Topology:
         for link in self.links:
             if link.status == 'on' and flow['_id'] in link.service_flows:
                 link.remove_service_from_link(flow)
+        self.incidence.remove_flow(flow)
+        self.path_latencies.pop(flow['_id'], None)
 
     ## NODES
 
@@ -336,6 +429,20 @@ class Topology:
         
         raise Exception("*** UNEXPECTED ERROR: {} AND {} ARE NEIGHBORS BUT NO LINK BETWEEN THEM WAS FOUND!".format(nodeA_name, nodeB_name))
 
+    def get_link_indices(self, path):
+        """
+        Returns the indices (in 'links'/'link_names') of the links along a path.
+
+        Arguments:
+            path {list} -- Ordered list of nodes.
+
+        Returns:
+            [np.ndarray] -- Link indices, in path order.
+        """
+
+        link_index = self.incidence.link_index
+        return np.array([link_index[path[i] + path[i+1]] for i in range(len(path)-1)], dtype=int)
+
     def update_link_status(self):
         for l in self.links:
             if l.consumed_bandwidth == 0:
@@ -380,12 +487,15 @@ class Topology:
 
         # Update current flows
         self.current_flows.append(service_flow)
+        self.incidence.add_flow(service_flow, path)
+        self.path_latencies[service_flow['_id']] = np.mean(self.link_latencies[self.get_link_indices(path)])
 
         for i in range(len(path)-1):
             link = self.get_link_between_neighbors(path[i], path[i+1])
             link.apply_service_on_link(service_flow)
             self.update_link_info(link)
-        self.save_topology_info()
+        if self.autosave:
+            self.save_topology_info()
 
     def remove_service_from_network(self, service_flow, path):
         """
@@ -398,12 +508,15 @@ class Topology:
 
         # Update current flows
         self.current_flows.remove(service_flow)
+        self.incidence.remove_flow(service_flow)
+        self.path_latencies.pop(service_flow['_id'], None)
 
         for i in range(len(path)-1):
             link = self.get_link_between_neighbors(path[i], path[i+1])
             link.remove_service_from_link(service_flow)
             self.update_link_info(link)
-        self.save_topology_info()        
+        if self.autosave:
+            self.save_topology_info()
 
     def get_reliability_score(self):
         # Return the max reliability score (for the most used link) 
@@ -422,6 +535,208 @@ class Topology:
         # Return the list of link percentage usage over all the network, for logging purposes
         return [x.bandwidth_usage for x in self.links]
 
+    ## FLOW-LINK INCIDENCE MATRIX
+
+    def get_link_loads(self):
+        """
+        Returns the bandwidth [Mbps] coupled to every link, computed from the incidence matrix.
+
+        Returns:
+            [np.ndarray] -- Link loads, ordered as 'link_names'.
+        """
+
+        return self.incidence.link_loads()
+
+    def get_link_flow_counts(self):
+        """
+        Returns the number of flows coupled to every link, computed from the incidence matrix.
+
+        Returns:
+            [np.ndarray] -- Link flow counts, ordered as 'link_names'.
+        """
+
+        return self.incidence.link_flow_counts()
+
+    def get_flow_latencies(self):
+        """
+        Returns the end-to-end latency [ms] and the number of hops of every applied flow.
+
+        Returns:
+            [dict] -- {flow id: (latency, hops)}.
+        """
+
+        latencies = self.incidence.flow_latencies(self.link_latencies)
+        hops = self.incidence.flow_hops()
+
+        return {f: (latencies[row], hops[row]) for f, row in self.incidence.flow_index.items()}
+
+    def get_flow_violations(self, threshold=1.0):
+        """
+        Returns the ids of the applied flows crossing at least one link whose usage is above 'threshold'.
+
+        Keyword Arguments:
+            threshold {float} -- Link usage threshold (default: {1.0}).
+
+        Returns:
+            [list] -- Ids of the violated flows.
+        """
+
+        usages = np.array(self.get_link_usages())
+        violated = self.incidence.flow_violations(usages, threshold)
+
+        return [f for f, row in self.incidence.flow_index.items() if violated[row]]
+
+    def validate_link_state(self, tolerance=1e-3):
+        """
+        Checks the operational state of every active link against the incidence matrix.
+
+        Keyword Arguments:
+            tolerance {float} -- Maximum admitted bandwidth mismatch [Mbps] (default: {1e-3}).
+
+        Returns:
+            [list] -- Ids of the links whose consumed bandwidth or flow count does not match.
+        """
+
+        loads = self.get_link_loads()
+        counts = self.get_link_flow_counts()
+
+        mismatches = []
+        for i, link in enumerate(self.links):
+            if link.status == 'off':
+                continue
+            if abs(link.consumed_bandwidth - loads[i]) > tolerance or len(link.service_flows) != counts[i]:
+                mismatches.append(link.id)
+
+        return mismatches
+
+    def get_path_latencies(self, flow_ids):
+        """
+        Returns the mean link latency [ms] along the path of every flow in 'flow_ids' (cached when the flow is applied).
+
+        Arguments:
+            flow_ids {list} -- Ids of applied flows.
+
+        Returns:
+            [np.ndarray] -- Mean latencies, ordered as 'flow_ids'.
+        """
+
+        return np.array([self.path_latencies[f] for f in flow_ids], dtype=float)
+
+    def get_path_violations(self, flow_ids, threshold=1.0):
+        """
+        Checks, for every flow in 'flow_ids', if any link along its path has a usage above 'threshold'.
+
+        Arguments:
+            flow_ids {list} -- Ids of applied flows.
+
+        Keyword Arguments:
+            threshold {float} -- Usage threshold (default: {1.0}, i.e. 100%).
+
+        Returns:
+            [np.ndarray] -- Boolean array, ordered as 'flow_ids'.
+        """
+
+        violated = self.incidence.flow_violations(self.get_link_usages(), threshold)
+        rows = [self.incidence.flow_index[f] for f in flow_ids]
+
+        return violated[rows]
+
+    def recompute_link_state(self):
+        """
+        Rebuilds the operational state (consumed bandwidth, usage, power, service flows) of every
+        active link from the incidence matrix in one shot, e.g. after a batch of updates.
+        """
+
+        loads = self.get_link_loads()
+        csc = self.incidence.tocsr().tocsc()
+        row_to_flow = {row: f for f, row in self.incidence.flow_index.items()}
+
+        for i, link in enumerate(self.links):
+            if link.status == 'off':
+                continue
+            rows = csc.indices[csc.indptr[i]:csc.indptr[i+1]]
+            link.service_flows = [row_to_flow[row] for row in sorted(rows)]
+            link.consumed_bandwidth = 0.0
+            link.consume_bandwidth(loads[i])
+            self.update_link_info(link)
+
+    ## CHECKPOINT
+
+    def get_state(self):
+        """
+        Returns the operational state of this Topology (see set_state): node/link status,
+        consumed bandwidth and service flows of every used link, applied flows and incidence matrix layout.
+
+        Returns:
+            [dict] -- JSON-serializable state.
+        """
+
+        links = {}
+        for link in self.links:
+            if link.status == 'off' or link.service_flows or link.consumed_bandwidth != 0:
+                links[link.id] = {"status": link.status, "consumed_bw": link.consumed_bandwidth, \
+                                  "service_flows": list(link.service_flows)}
+
+        return {
+            "nodes_off": [node.name for node in self.nodes if node.status == 'off'],
+            "links": links,
+            "faulty_node_list": list(self.faulty_node_list),
+            "current_flows": list(self.current_flows),
+            "incidence": self.incidence.get_state()
+        }
+
+    def set_state(self, state, flows):
+        """
+        Restores an operational state saved by get_state on a new Topology (no flows applied yet),
+        built with the same routing method.
+
+        Arguments:
+            state {dict} -- State returned by get_state.
+            flows {dict} -- (flow, path) tuple of every applied flow, indexed by flow id.
+        """
+
+        if self.current_flows:
+            raise Exception('*** STATE CAN ONLY BE RESTORED ON A TOPOLOGY WITHOUT FLOWS ***')
+
+        for node_name in state["nodes_off"]:
+            node = self.get_one_node(node_name)
+            node.status = 'off'
+            self.update_node_info(node)
+
+        for link in self.links:
+            saved = state["links"].get(link.id, {"status": 'on', "consumed_bw": 0.0, "service_flows": []})
+            if saved["status"] == 'off':
+                if link.status == 'on':
+                    self.switch_off_link(link)
+                continue
+            if link.status == 'off':
+                self.turn_on_link(link)
+            # Bit-identical consumed bandwidth (0 + x == x), usage and power
+            link.service_flows = list(saved["service_flows"])
+            link.consumed_bandwidth = 0.0
+            link.consume_bandwidth(saved["consumed_bw"])
+            self.update_link_info(link)
+
+        self.faulty_node_list = list(state["faulty_node_list"])
+        self.current_flows = list(state["current_flows"])
+        self.incidence.set_state(state["incidence"], flows)
+        self.path_latencies = {flow_id: np.mean(self.link_latencies[self.get_link_indices(path)]) \
+                               for flow_id, (_, path) in flows.items() if flow_id in self.incidence}
+
+    ## SNAPSHOTS
+
+    def snapshot(self):
+        """
+        Returns a copy-on-write snapshot of this Topology operational link state.
+        Flows can be tentatively applied/removed and links switched off on the snapshot
+        without touching this Topology, then committed or discarded.
+
+        Returns:
+            [TopologySnapshot] -- Snapshot of this Topology.
+        """
+
+        return TopologySnapshot(self)
+
     ## TOPO OBJECT
 
     def save_topology_info(self):
@@ -637,6 +952,9 @@ class Topology:
         elif routing_method == 'Hop_by_hop':
             self.init_Hop_by_hop()
             self.get_path = self.get_path_hop_by_hop
+        elif routing_method is None:
+            # No routing (e.g. traffic matrix estimation on large topologies)
+            self.get_path = None
         else:
             raise NotImplementedError
 
@@ -1325,11 +1643,12 @@ class Link:
         self.power_consumption_MORA = self.get_power_consumption(self.consumed_bandwidth)
         self.update_info()
 
-    def get_power_consumption(self, x, delta = 180, rho = 5e-4, mu = 1e-03, alpha = 1.4, n_l = 1):
+    def get_power_consumption(self, x, delta = power_model.DELTA, rho = power_model.RHO, mu = power_model.MU, alpha = power_model.ALPHA, n_l = power_model.N_L):
         """
         Calculate actual power consumed by this link.
 
-        See paper IEEE "A Hop-by-Hop Routing Mechanism for Green Internet"
+        See paper IEEE "A Hop-by-Hop Routing Mechanism for Green Internet".
+        For many links at once, use the vectorized PowerModel of the Topology.
 
         Args:
             x ([type]): [description]
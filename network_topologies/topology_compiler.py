@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.dont_write_bytecode
+import json
+import os
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, shortest_path
+
+# Static link attributes stored in the compiled format, with their defaults
+# (used when an attribute is missing from the source layout, e.g. 'len'/'alu' in pseudogeant).
+LINK_FIELDS = {
+    "bw": 0.0,      # capacity [Mbps]
+    "len": 0.0,     # length [Km]
+    "delay": 0.0,   # latency [ms]
+    "jitter": 0.0,  # jitter [ms]
+    "loss": 0.0,    # packet loss [%]
+    "alu": 0.0      # average link usage [Mbps]
+}
+
+def read_from_json(json_path):
+    """
+    Returns data read from json file at found at 'json_path' location.
+
+    Arguments:
+        json_path {str} -- relative path of json file to be read.
+
+    Returns:
+        [dict] -- Dictionary with data read from json.
+    """
+
+    # Read data
+    with open(json_path, 'r') as json_file:
+        data = json.load(json_file)
+
+    return data
+
+def get_compiled_path(topo_name):
+    """
+    Returns the default location of the compiled topology 'topo_name', i.e. ./'topo_name'/'topo_name'_compiled/
+
+    Args:
+        topo_name (string): topology name.
+    """
+
+    current_dir = os.path.dirname(__file__)
+    return os.path.join(current_dir, topo_name, topo_name + '_compiled')
+
+def _flatten(lists):
+    # Flatten a list of lists into (values, pointers), CSR-style
+    pointers = np.zeros(len(lists) + 1, dtype=np.int64)
+    pointers[1:] = np.cumsum([len(l) for l in lists])
+    values = [v for l in lists for v in l]
+    return np.array(values, dtype=str), pointers
+
+def compile_topology(topo_name, node_dict, link_dict, compiled_path):
+    """
+    Writes the static attributes of a topology to a compiled topology.
+
+    Nodes and links are stored as NumPy arrays plus a name table; run-time state
+    (status, consumed bandwidth, service flows...) is not stored. A compiled topology is either
+    a folder with one .npy file per array (memory-mapped by load_compiled) or a single .npz archive.
+
+    Args:
+        topo_name (string): topology name.
+        node_dict (dict): dictionary of nodes and nodes' properties.
+        link_dict (dict): dictionary of links and links' properties.
+        compiled_path (string): location of the compiled folder (or .npz file).
+    """
+
+    nodes = list(node_dict.values())
+    links = list(link_dict.values())
+
+    pops = [n.get('pop', {}) for n in nodes]
+    node_links, node_link_ptr = _flatten([list(n['links'].values()) for n in nodes])
+    node_link_keys, _ = _flatten([list(n['links'].keys()) for n in nodes])
+    node_neighbors, node_neighbor_ptr = _flatten([list(n['neighbors'].values()) for n in nodes])
+    node_neighbor_keys, _ = _flatten([list(n['neighbors'].keys()) for n in nodes])
+
+    arrays = {
+        "name": np.array(topo_name),
+        # NODES
+        "node_names": np.array([n['_id'] for n in nodes], dtype=str),
+        "node_city": np.array([p.get('city', 'N.A.') for p in pops], dtype=str),
+        "node_nation": np.array([p.get('nation', 'N.A.') for p in pops], dtype=str),
+        "node_latitude": np.array([p.get('latitude', np.nan) for p in pops], dtype=float),
+        "node_longitude": np.array([p.get('longitude', np.nan) for p in pops], dtype=float),
+        "node_links": node_links,
+        "node_link_keys": node_link_keys,
+        "node_link_ptr": node_link_ptr,
+        "node_neighbors": node_neighbors,
+        "node_neighbor_keys": node_neighbor_keys,
+        "node_neighbor_ptr": node_neighbor_ptr,
+        # LINKS
+        "link_names": np.array([l['_id'] for l in links], dtype=str),
+        "link_node1": np.array([l['node1'] for l in links], dtype=str),
+        "link_node2": np.array([l['node2'] for l in links], dtype=str),
+    }
+    for field, default in LINK_FIELDS.items():
+        arrays["link_" + field] = np.array([l.get(field, default) for l in links], dtype=float)
+
+    if compiled_path.endswith('.npz'):
+        np.savez(compiled_path, **arrays)
+    else:
+        os.makedirs(compiled_path, exist_ok=True)
+        for key, array in arrays.items():
+            np.save(os.path.join(compiled_path, key + '.npy'), array)
+
+def compile_from_json(topo_name, source='db', compiled_path=None):
+    """
+    Converts the JSON description of topology 'topo_name' into the compiled format.
+
+    Args:
+        topo_name (string): topology name.
+        source (string, optional): 'db' to read ./'topo_name'/'topo_name'DB/{nodes,links}.json,
+            'metadata' to read ./'topo_name'/'topo_name'_metadata.json. Defaults to 'db'.
+        compiled_path (string, optional): location of the compiled topology. Defaults to ./'topo_name'/'topo_name'_compiled/
+
+    Returns:
+        [string]: location of the compiled topology.
+    """
+
+    current_dir = os.path.dirname(__file__)
+
+    if source == 'db':
+        db_path = os.path.join(current_dir, topo_name, topo_name + 'DB')
+        node_dict = read_from_json(os.path.join(db_path, 'nodes.json'))
+        link_dict = read_from_json(os.path.join(db_path, 'links.json'))
+    elif source == 'metadata':
+        meta = read_from_json(os.path.join(current_dir, topo_name, topo_name + '_metadata.json'))
+        node_dict = meta['nodes']
+        link_dict = meta['links']
+    else:
+        raise Exception('*** {} IS NOT A VALID SOURCE! ***'.format(source))
+
+    if compiled_path is None:
+        compiled_path = get_compiled_path(topo_name)
+
+    compile_topology(topo_name, node_dict, link_dict, compiled_path)
+
+    return compiled_path
+
+def load_compiled(compiled_path):
+    """
+    Reads a compiled topology. The arrays of a compiled folder are memory-mapped (read-only),
+    those of a .npz archive are read in memory.
+
+    Args:
+        compiled_path (string): location of the compiled folder (or .npz file).
+
+    Returns:
+        [dict]: array name -> array (see compile_topology).
+    """
+
+    if os.path.isdir(compiled_path):
+        return {f[:-len('.npy')]: np.load(os.path.join(compiled_path, f), mmap_mode='r', allow_pickle=False) \
+                for f in os.listdir(compiled_path) if f.endswith('.npy')}
+
+    with np.load(compiled_path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+def get_node_pops(arrays):
+    # Node 'pop' dictionaries (coordinates only when known)
+    pops = []
+    for city, nation, latitude, longitude in zip(arrays['node_city'].tolist(), arrays['node_nation'].tolist(), \
+            arrays['node_latitude'].tolist(), arrays['node_longitude'].tolist()):
+        pop = {'city': city, 'nation': nation}
+        if not np.isnan(latitude):
+            pop['latitude'] = latitude
+            pop['longitude'] = longitude
+        pops.append(pop)
+    return pops
+
+def get_node_adjacency(arrays, key):
+    # Per-node {key: value} dictionaries of the flattened 'node_links'/'node_neighbors' arrays
+    values = arrays['node_' + key].tolist()
+    keys = arrays['node_{}_keys'.format(key[:-1])].tolist()
+    pointers = arrays['node_{}_ptr'.format(key[:-1])].tolist()
+    return [dict(zip(keys[pointers[i]:pointers[i+1]], values[pointers[i]:pointers[i+1]])) \
+            for i in range(len(pointers) - 1)]
+
+def get_reachability(arrays):
+    """
+    Returns the reachability matrix of a compiled topology with all its nodes and links on
+    (same layout as Topology.get_reachability_matrix, without its per-node DFS).
+
+    Returns:
+        [list] -- Reachability Matrix (element i, j is True if node j is reachable from node i).
+    """
+
+    names = arrays['node_names'].tolist()
+    node_index = {name: i for i, name in enumerate(names)}
+    pointers = np.asarray(arrays['node_neighbor_ptr'])
+    rows = np.repeat(np.arange(len(names)), np.diff(pointers))
+    columns = np.array([node_index[n] for n in arrays['node_neighbors'].tolist()], dtype=int)
+    adjacency = csr_matrix((np.ones(len(columns)), (rows, columns)), shape=(len(names), len(names)))
+
+    if (adjacency != adjacency.T).nnz == 0:
+        # Undirected: a node reaches exactly the nodes of its connected component
+        _, labels = connected_components(adjacency, directed=False)
+        return (labels[:, None] == labels[None, :]).tolist()
+
+    return np.isfinite(shortest_path(adjacency, unweighted=True)).tolist()
+
+def get_topology_dicts(arrays):
+    """
+    Converts a compiled topology back to the JSON layout.
+
+    Args:
+        arrays (dict): compiled topology (see load_compiled).
+
+    Returns:
+        [tuple]: (topology name, node_dict, link_dict), in the layout expected by Topology.
+    """
+
+    node_dict = {}
+    for i, (name, pop, links, neighbors) in enumerate(zip(arrays['node_names'].tolist(), get_node_pops(arrays), \
+            get_node_adjacency(arrays, 'links'), get_node_adjacency(arrays, 'neighbors'))):
+        node_dict['node{}'.format(i + 1)] = {"_id": name, "pop": pop, "links": links, "neighbors": neighbors}
+
+    columns = [arrays['link_' + field].tolist() for field in LINK_FIELDS]
+    link_dict = {}
+    for i, (name, node1, node2) in enumerate(zip(arrays['link_names'].tolist(), \
+            arrays['link_node1'].tolist(), arrays['link_node2'].tolist())):
+        link_info = {"_id": name, "node1": node1, "node2": node2}
+        link_info.update(zip(LINK_FIELDS, (c[i] for c in columns)))
+        link_dict['link{}'.format(i + 1)] = link_info
+
+    return str(arrays['name']), node_dict, link_dict
+
+
+def main():
+
+    # Usage: python -m network_topologies.topology_compiler <topo_name> [db|metadata] [compiled path]
+    topo_name = sys.argv[1]
+    source = sys.argv[2] if len(sys.argv) > 2 else 'db'
+    compiled_path = compile_from_json(topo_name, source, sys.argv[3] if len(sys.argv) > 3 else None)
+    print(" *** {} COMPILED TO {} *** ".format(topo_name, compiled_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.dont_write_bytecode
+import argparse
+import datetime
+import json
+import os
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components, shortest_path
+
+# Synthetic nodes are scattered over a (latitude, longitude) box roughly covering Europe
+LATITUDE_RANGE = (35.0, 60.0)
+LONGITUDE_RANGE = (-10.0, 30.0)
+
+# Link capacities [Mbps], assigned by endpoint degree (core links get the biggest ones)
+BANDWIDTH_TIERS = [10000, 40000, 100000, 300000]
+
+LIGHT_SPEED_IN_FIBER = 200000.0  # Km/s
+EARTH_RADIUS = 6371.0  # Km
+
+FAMILIES = ['waxman', 'barabasi_albert', 'grid', 'ring_of_rings']
+
+
+def write_to_json(data, filename, json_path):
+    """
+    Write 'data' to json file named 'filename' at 'json_path' location.
+
+    Arguments:
+        data {dict} -- data to be written.
+        filename {str} -- name of file to be created/overwritten.
+        json_path {str} -- relative path of json file to be created/overwritten,
+    """
+
+    # Get the complete path
+    filepath = os.path.join(json_path, filename)
+
+    # Write data
+    with open(filepath + '.json', 'w+') as f:
+            json.dump(data, f, sort_keys=True, indent=4)
+
+def get_node_names(n_nodes):
+    """
+    Returns 'n_nodes' node names of equal length ('00', '01', ...), as link ids are built as node1 + node2.
+    """
+
+    width = max(2, len(str(n_nodes - 1)))
+    return [str(i).zfill(width) for i in range(n_nodes)]
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Returns the great-circle distance [Km] between arrays of coordinates (degrees).
+    """
+
+    lat1, lon1, lat2, lon2 = (np.radians(x) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+# ************ GRAPH FAMILIES ************
+#
+# Every family returns a set of undirected edges (i, j) with i < j.
+
+def waxman_edges(coordinates, rng, alpha=0.4, mean_degree=4):
+    """
+    Waxman random graph: nodes i, j are connected with probability proportional to exp(-d_ij / (alpha * L)),
+    L being the maximum distance between two nodes. Probabilities are scaled to get about 'mean_degree'
+    neighbors per node, whatever the number of nodes.
+    """
+
+    n_nodes = len(coordinates)
+    i, j = np.triu_indices(n_nodes, k=1)
+    d = haversine(coordinates[i, 0], coordinates[i, 1], coordinates[j, 0], coordinates[j, 1])
+    p = np.exp(-d / (alpha * d.max()))
+    p = np.minimum(1.0, p * (mean_degree * n_nodes / 2.0) / p.sum())
+    selected = rng.random_sample(len(p)) < p
+
+    return set(zip(i[selected].tolist(), j[selected].tolist()))
+
+def barabasi_albert_edges(n_nodes, rng, m=2):
+    """
+    Barabasi-Albert preferential attachment graph: every new node attaches to 'm' existing nodes,
+    chosen with probability proportional to their degree.
+    """
+
+    m = max(1, min(m, n_nodes - 1))
+    edges = set()
+    targets = list(range(m))   # first new node attaches to the m seed nodes
+    repeated_nodes = []        # every node appears once per incident edge
+
+    for source in range(m, n_nodes):
+        for target in set(targets):
+            edges.add((min(source, target), max(source, target)))
+        repeated_nodes.extend(targets)
+        repeated_nodes.extend([source] * m)
+        # Choose m distinct targets for the next node
+        targets = set()
+        while len(targets) < m:
+            targets.add(repeated_nodes[rng.randint(len(repeated_nodes))])
+        targets = list(targets)
+
+    return edges
+
+def grid_edges(n_nodes):
+    """
+    2D grid (row-major, 'cols' = ceil(sqrt(n_nodes))): every node is linked to its right and lower neighbor.
+    """
+
+    cols = int(np.ceil(np.sqrt(n_nodes)))
+    edges = set()
+    for k in range(n_nodes):
+        if (k + 1) % cols != 0 and k + 1 < n_nodes:
+            edges.add((k, k + 1))
+        if k + cols < n_nodes:
+            edges.add((k, k + cols))
+
+    return edges
+
+def ring_of_rings_edges(n_nodes, ring_size=8):
+    """
+    Ring of rings: nodes are split into rings of (at least) 'ring_size' nodes;
+    the first node of every ring belongs to a core ring.
+    """
+
+    n_rings = max(1, n_nodes // ring_size)
+    bounds = np.linspace(0, n_nodes, n_rings + 1).astype(int)
+    edges = set()
+
+    def add_ring(members):
+        if len(members) < 2:
+            return
+        for a, b in zip(members, members[1:] + members[:1]):
+            if a != b:
+                edges.add((min(a, b), max(a, b)))
+
+    for r in range(n_rings):
+        add_ring(list(range(bounds[r], bounds[r + 1])))
+    add_ring([int(b) for b in bounds[:-1]])
+
+    return edges
+
+def connect_components(edges, coordinates):
+    """
+    Links every connected component to the closest node of the first component.
+    """
+
+    n_nodes = len(coordinates)
+    if not edges:
+        edges = set()
+    rows, cols = zip(*edges) if edges else ((), ())
+    graph = coo_matrix((np.ones(len(rows)), (rows, cols)), shape=(n_nodes, n_nodes))
+    n_components, labels = connected_components(graph, directed=False)
+
+    main = np.flatnonzero(labels == 0)
+    for c in range(1, n_components):
+        member = np.flatnonzero(labels == c)[0]
+        d = haversine(coordinates[member, 0], coordinates[member, 1], coordinates[main, 0], coordinates[main, 1])
+        closest = int(main[np.argmin(d)])
+        edges.add((min(member, closest), max(member, closest)))
+
+    return edges
+
+# ************ TOPOLOGY ************
+
+def generate_topology(family, n_nodes, seed=64, **params):
+    """
+    Generates a synthetic topology.
+
+    Args:
+        family (string): one of 'waxman', 'barabasi_albert', 'grid', 'ring_of_rings'.
+        n_nodes (int): number of nodes.
+        seed (int, optional): random seed. Defaults to 64.
+        **params: family parameters (alpha/mean_degree for waxman, m for barabasi_albert, ring_size for ring_of_rings).
+
+    Returns:
+        [tuple]: (node_dict, link_dict), in the metadata/DB layout read by Topology.
+    """
+
+    rng = np.random.RandomState(seed)
+    names = get_node_names(n_nodes)
+    coordinates = np.column_stack((rng.uniform(*LATITUDE_RANGE, size=n_nodes),
+                                   rng.uniform(*LONGITUDE_RANGE, size=n_nodes)))
+
+    if family == 'waxman':
+        edges = waxman_edges(coordinates, rng, **params)
+    elif family == 'barabasi_albert':
+        edges = barabasi_albert_edges(n_nodes, rng, **params)
+    elif family == 'grid':
+        edges = grid_edges(n_nodes)
+    elif family == 'ring_of_rings':
+        edges = ring_of_rings_edges(n_nodes, **params)
+    else:
+        raise NotImplementedError
+    edges = sorted(connect_components(edges, coordinates))
+
+    # Link attributes
+    edge_array = np.array(edges)
+    degree = np.bincount(edge_array.ravel(), minlength=n_nodes)
+    edge_degree = degree[edge_array[:, 0]] + degree[edge_array[:, 1]]
+    quantiles = np.quantile(edge_degree, np.linspace(0, 1, len(BANDWIDTH_TIERS) + 1)[1:-1])
+    bandwidths = np.array(BANDWIDTH_TIERS)[np.searchsorted(quantiles, edge_degree, side='right')]
+    lengths = haversine(coordinates[edge_array[:, 0], 0], coordinates[edge_array[:, 0], 1],
+                        coordinates[edge_array[:, 1], 0], coordinates[edge_array[:, 1], 1])
+    delays = np.round(1000 * lengths / LIGHT_SPEED_IN_FIBER, 1)
+    alus = np.round(bandwidths * rng.uniform(0.05, 0.4, size=(len(edges), 2)).T, 0)
+
+    # Build dictionaries (every undirected edge becomes two directed links)
+    node_links = [[] for _ in range(n_nodes)]
+    node_neighbors = [[] for _ in range(n_nodes)]
+    link_dict = {}
+    for e, (i, j) in enumerate(edges):
+        for direction, (a, b) in enumerate(((i, j), (j, i))):
+            link_id = names[a] + names[b]
+            link_dict['link{}'.format(len(link_dict) + 1)] = {
+                "_id": link_id,
+                "node1": names[a],
+                "node2": names[b],
+                "bw": int(bandwidths[e]),
+                "len": round(float(lengths[e]), 3),
+                "delay": float(delays[e]),
+                "jitter": 0,
+                "loss": 0,
+                "alu": float(alus[direction][e])
+            }
+            node_links[i].append(link_id)
+            node_links[j].append(link_id)
+        node_neighbors[i].append(names[j])
+        node_neighbors[j].append(names[i])
+
+    node_dict = {}
+    for k, name in enumerate(names):
+        node_dict['node{}'.format(k + 1)] = {
+            "_id": name,
+            "pop": {"city": "N.A.", "nation": "N.A.",
+                    "latitude": round(float(coordinates[k, 0]), 7),
+                    "longitude": round(float(coordinates[k, 1]), 7)},
+            "links": {'link{}'.format(i + 1): l for i, l in enumerate(node_links[k])},
+            "neighbors": {'neighbor{}'.format(i + 1): n for i, n in enumerate(node_neighbors[k])}
+        }
+
+    return node_dict, link_dict
+
+def save_topology(topo_name, node_dict, link_dict, path=None):
+    """
+    Saves a topology both in the metadata layout (./'topo_name'/'topo_name'_metadata.json)
+    and in the DB layout (./'topo_name'/'topo_name'DB/nodes.json, links.json).
+
+    Args:
+        topo_name (string): topology name.
+        node_dict (dict): dictionary of nodes and nodes' properties.
+        link_dict (dict): dictionary of links and links' properties.
+        path (string, optional): parent folder. Defaults to the network_topologies folder.
+
+    Returns:
+        [string]: topology folder.
+    """
+
+    if path is None:
+        path = os.path.dirname(__file__)
+    topo_path = os.path.join(path, topo_name)
+    database_path = os.path.join(topo_path, topo_name + 'DB')
+    os.makedirs(database_path, exist_ok=True)
+
+    write_to_json({'nodes': node_dict, 'links': link_dict}, topo_name + '_metadata', topo_path)
+    write_to_json(node_dict, 'nodes', database_path)
+    write_to_json(link_dict, 'links', database_path)
+
+    return topo_path
+
+# ************ TRAFFIC ************
+
+def get_mean_hops(node_dict, link_dict):
+    """
+    Returns the mean number of hops of the (unweighted) shortest paths between every pair of nodes.
+    """
+
+    names = [n['_id'] for n in node_dict.values()]
+    index = {name: i for i, name in enumerate(names)}
+    rows = [index[l['node1']] for l in link_dict.values()]
+    cols = [index[l['node2']] for l in link_dict.values()]
+    graph = coo_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(names), len(names))).tocsr()
+    hops = shortest_path(graph, unweighted=True)
+
+    return np.mean(hops[np.isfinite(hops) & (hops > 0)])
+
+def generate_traffic_series(node_dict, link_dict, n_samples=288, seed=64, load=0.3, interval=5, \
+                            start=datetime.datetime(2020, 4, 1)):
+    """
+    Generates a time series of gravity-model traffic matrices.
+
+    The traffic between i and j is proportional to m_i * m_j, with lognormal node masses.
+    The overall volume follows a daily sinusoid, so that the mean link usage is about 'load',
+    and every sample is perturbed by 10% lognormal noise.
+
+    Args:
+        node_dict (dict): dictionary of nodes and nodes' properties.
+        link_dict (dict): dictionary of links and links' properties.
+        n_samples (int, optional): number of traffic matrices. Defaults to 288 (one day).
+        seed (int, optional): random seed. Defaults to 64.
+        load (float, optional): target mean link usage. Defaults to 0.3.
+        interval (int, optional): minutes between two samples. Defaults to 5.
+        start (datetime, optional): timestamp of the first sample. Defaults to 2020-04-01 00:00:00.
+
+    Yields:
+        [tuple]: (timestamp string, traffic matrix {src: {dst: bps}}).
+    """
+
+    rng = np.random.RandomState(seed)
+    names = [n['_id'] for n in node_dict.values()]
+    n_nodes = len(names)
+
+    # Total volume [bps] that loads links, on average, at 'load'
+    capacity = sum(l['bw'] for l in link_dict.values()) * 1e6
+    total = load * capacity / get_mean_hops(node_dict, link_dict)
+
+    masses = rng.lognormal(mean=0.0, sigma=1.0, size=n_nodes)
+    gravity = np.outer(masses, masses)
+    np.fill_diagonal(gravity, 0)
+    gravity *= total / gravity.sum()
+
+    for t in range(n_samples):
+        daily = 1 + 0.5 * np.sin(2 * np.pi * t * interval / 1440.0 - np.pi / 2)
+        noise = rng.lognormal(mean=0.0, sigma=0.1, size=(n_nodes, n_nodes))
+        matrix = np.round(gravity * daily * noise, 0)
+        timestamp = (start + datetime.timedelta(minutes=t * interval)).strftime("%Y-%m-%d %H:%M:%S")
+        yield timestamp, {names[i]: {names[j]: matrix[i, j] for j in range(n_nodes) if j != i} \
+                          for i in range(n_nodes)}
+
+def save_traffic_series(series, path):
+    """
+    Writes a traffic series in the service_flows layout: one '<timestamp>_traffic_matrices.json' file per sample.
+
+    Args:
+        series (iterable): (timestamp, traffic matrix) tuples, see generate_traffic_series.
+        path (string): destination folder.
+    """
+
+    os.makedirs(path, exist_ok=True)
+    for timestamp, matrix in series:
+        write_to_json(matrix, '{}_traffic_matrices'.format(timestamp), path)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Generate a synthetic topology and its traffic matrices.')
+    parser.add_argument('family', choices=FAMILIES)
+    parser.add_argument('n_nodes', type=int)
+    parser.add_argument('--name', help='topology name (default: <family>_<n_nodes>)')
+    parser.add_argument('--seed', type=int, default=64)
+    parser.add_argument('--samples', type=int, default=288, help='number of traffic matrices')
+    parser.add_argument('--load', type=float, default=0.3, help='target mean link usage')
+    parser.add_argument('--traffic-path', help='traffic folder (default: service_flows/<name>_traffic)')
+    args = parser.parse_args()
+
+    topo_name = args.name or '{}_{}'.format(args.family, args.n_nodes)
+    node_dict, link_dict = generate_topology(args.family, args.n_nodes, seed=args.seed)
+    topo_path = save_topology(topo_name, node_dict, link_dict)
+    print(" *** {}: {} NODES, {} LINKS -> {} *** ".format(topo_name, len(node_dict), len(link_dict), topo_path))
+
+    if args.samples > 0:
+        traffic_path = args.traffic_path or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), \
+                                                         'service_flows', topo_name + '_traffic')
+        series = generate_traffic_series(node_dict, link_dict, n_samples=args.samples, seed=args.seed, load=args.load)
+        save_traffic_series(series, traffic_path)
+        print(" *** {} TRAFFIC MATRICES -> {} *** ".format(args.samples, traffic_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,16 @@ import sys
 sys.dont_write_bytecode
 import json
 import os
+import numpy as np
 from geopy.geocoders import Nominatim  # https://github.com/geopy/geopy
-from geopy.distance import great_circle
+from geopy.distance import EARTH_RADIUS
 from service_flows.data_processor import get_mean_link_bw
 import time
 
+THIS_FILE_PATH = os.path.dirname(__file__)
+# Geocoding results ("<city>, <nation>" -> [latitude, longitude]), shared by all topologies
+GEOCODE_CACHE_PATH = os.path.join(THIS_FILE_PATH, 'geocode_cache.json')
+
 def read_from_json(json_path):
     """
     Returns data read from json file at found at 'json_path' location.
@@ -42,12 +47,16 @@ def write_to_json(data, filename, json_path):
     with open(filepath + '.json', 'w+') as f:
             json.dump(data, f, sort_keys=True, indent=4)
 
-def preprocess_metadata(topo_name):
+def preprocess_metadata(topo_name, offline=False):
     """
     Add geo-coordinates (latitude-longitude) to network nodes and calculate length/latency of every network link.
 
+    Geo-coordinates are read from the geocode cache (see load_geocode_cache) and only the locations not found
+    there are looked up online.
+
     Args:
         topo_name (string): topology name.
+        offline (bool, optional): never look up locations online (missing locations raise). Defaults to False.
     """
 
     # Get topology metadata
@@ -60,7 +69,7 @@ def preprocess_metadata(topo_name):
     print(" *** PREPROCESSING METADATA *** ")
     
     print(" *** ADDING GEO-COORDINATES and LINK LATENCY ***")
-    add_geo_coordinates(node_dict)
+    add_geo_coordinates(node_dict, load_geocode_cache(topo_name), offline=offline)
     calculate_latency(link_dict, node_dict)
 
     # ???
@@ -85,27 +94,82 @@ def set_average_link_usage(link_dict):
             if link_dict[link]["_id"] == link_bw:
                 link_dict[link]["alu"] = round(mean_link_bw[link_bw]/1e6,0)
 
-def add_geo_coordinates(node_dict):
+def load_geocode_cache(topo_name=None):
+    """
+    Returns the geocode cache: the locations stored in GEOCODE_CACHE_PATH, plus (seed) the coordinates
+    of the nodes already saved in the database of 'topo_name' (e.g. geantDB/nodes.json).
+
+    Args:
+        topo_name (string, optional): topology whose saved nodes seed the cache. Defaults to None.
+
+    Returns:
+        [dict]: "<city>, <nation>" -> [latitude, longitude].
+    """
+
+    cache = read_from_json(GEOCODE_CACHE_PATH) if os.path.exists(GEOCODE_CACHE_PATH) else {}
+
+    if topo_name is not None:
+        nodes_path = os.path.join(THIS_FILE_PATH, topo_name, topo_name + 'DB', 'nodes.json')
+        if os.path.exists(nodes_path):
+            for node in read_from_json(nodes_path).values():
+                pop = node.get('pop', {})
+                if 'latitude' in pop and 'longitude' in pop:
+                    cache.setdefault(get_location_key(pop), [pop['latitude'], pop['longitude']])
+
+    return cache
+
+def save_geocode_cache(cache):
+    """
+    Writes the geocode cache (atomically, so that concurrent readers never see a partial file).
+    """
+
+    tmp_path = GEOCODE_CACHE_PATH + '.{}.tmp'.format(os.getpid())
+    with open(tmp_path, 'w+') as f:
+        json.dump(cache, f, sort_keys=True, indent=4)
+    os.replace(tmp_path, GEOCODE_CACHE_PATH)
+
+def get_location_key(pop):
+    # Geocoding query (and cache key) of a PoP
+    return "{}, {}".format(pop['city'], pop['nation'])
+
+def add_geo_coordinates(node_dict, cache=None, offline=False):
     """
     Add geo-coordinates (latitude-longitude) to a network node.
 
+    Locations found in 'cache' are not looked up; the others are looked up online (Nominatim, one request
+    per second) and added to the cache, which is then saved.
+
     Args:
         node_dict (dict): node attributes.
+        cache (dict, optional): geocode cache (see load_geocode_cache). Defaults to the saved cache.
+        offline (bool, optional): never look up locations online (missing locations raise). Defaults to False.
     """
 
-    geolocator = Nominatim(user_agent='geant')
+    cache = load_geocode_cache() if cache is None else cache
+    geolocator = None
+    new_locations = 0
 
     for node in node_dict:
         # Extract city and nation values from node. This is where the PoP is.
-        city = node_dict[node]['pop']['city']
-        nation = node_dict[node]['pop']['nation']
-        # Get geographical info on the PoP location.
-        location = geolocator.geocode("{}, {}".format(city, nation))
+        query = get_location_key(node_dict[node]['pop'])
+
+        if query not in cache:
+            if offline:
+                raise Exception('*** NO GEO-COORDINATES FOR {} IN THE GEOCODE CACHE ***'.format(query))
+            # Get geographical info on the PoP location (Nominatim usage policy: at most one request per second).
+            if geolocator is None:
+                geolocator = Nominatim(user_agent='geant')
+            elif new_locations:
+                time.sleep(1)
+            location = geolocator.geocode(query)
+            cache[query] = [location.latitude, location.longitude]
+            new_locations += 1
         
         # Set latitude and longitude info for the node.
-        node_dict[node]['pop']['latitude'] = location.latitude
-        node_dict[node]['pop']['longitude'] = location.longitude
-        time.sleep(1)
+        node_dict[node]['pop']['latitude'], node_dict[node]['pop']['longitude'] = cache[query]
+
+    if new_locations:
+        save_geocode_cache(cache)
     
 def calculate_latency(link_dict, node_dict):
     """
@@ -116,29 +180,28 @@ def calculate_latency(link_dict, node_dict):
         node_dict (dict): node attributes.
     """
 
-    for link in link_dict:
-        node1 = link_dict[link]['node1']
-        node2 = link_dict[link]['node2']
-        for node in node_dict:
-            if node_dict[node]['_id'] == node1:
-                node1_latitude  = node_dict[node]['pop']['latitude']
-                node1_longitude  = node_dict[node]['pop']['longitude']
-                node1_coordinates = (node1_latitude, node1_longitude)
-            elif node_dict[node]['_id'] == node2:
-                node2_latitude  = node_dict[node]['pop']['latitude']
-                node2_longitude  = node_dict[node]['pop']['longitude']
-                node2_coordinates = (node2_latitude, node2_longitude)
-        
-        # link length is calculated as the air-line distance between the two link endpoints
-        distance = great_circle(node1_coordinates, node2_coordinates).kilometers  # Km
+    links = list(link_dict)
+    if not links:
+        return
+
+    # Node id -> (latitude, longitude) [deg]
+    coordinates = {node_dict[node]['_id']: (node_dict[node]['pop']['latitude'], node_dict[node]['pop']['longitude']) \
+                   for node in node_dict}
+    node1 = np.radians([coordinates[link_dict[link]['node1']] for link in links])
+    node2 = np.radians([coordinates[link_dict[link]['node2']] for link in links])
+
+    # link length is calculated as the air-line distance between the two link endpoints (haversine formula)
+    delta = node2 - node1
+    h = np.sin(delta[:, 0]/2)**2 + np.cos(node1[:, 0]) * np.cos(node2[:, 0]) * np.sin(delta[:, 1]/2)**2
+    distances = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(h))  # Km
 
-        # link latency (delay) is estimated taking into account the speed of light in optical fiber medium (200000 Km/s)
-        light_speed_in_fiber = 200000.0  # Km/s
-        delay = 1000 * (distance/light_speed_in_fiber)  # ms
-        delay = round(delay, 1)
+    # link latency (delay) is estimated taking into account the speed of light in optical fiber medium (200000 Km/s)
+    light_speed_in_fiber = 200000.0  # Km/s
+    delays = 1000 * (distances/light_speed_in_fiber)  # ms
 
+    for link, distance, delay in zip(links, distances.tolist(), delays.tolist()):
         # OUTPUT
-        link_dict[link]['delay'] = delay  # ms
+        link_dict[link]['delay'] = round(delay, 1)  # ms
         link_dict[link]['len'] = round(distance, 3)  # Km
 
 def save_topology_info(topo_name, node_dict, link_dict):
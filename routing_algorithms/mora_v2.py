@@ -23,6 +23,17 @@ def eval_bandwidth_single_link(percentage):
     elif percentage < 0.6:
         return 0
     
+def eval_bandwidth_links(percentages):
+    """Vectorized version of eval_bandwidth_single_link
+
+    Args:
+        percentages ([np.ndarray]): The percentage utilization of the target links
+
+    Returns:
+        [np.ndarray]: the cost associated with each percentage usage
+    """
+    return np.where(percentages > 0.6, 6.25*(percentages**2) - 7.5*percentages + 2.25, 0.0)
+
 def get_evaluate_individual(topology, flow):
     """Generate a cost function for the individual characterized from flow
 
@@ -36,15 +47,17 @@ def get_evaluate_individual(topology, flow):
             reliability mean {Function}: the mean reliability cost if the current individual is chosen
             latency {Function}: the overall latency of the path if the current individual is chosen
     """
+    # The link state does not change while a flow is optimized: take it once
+    power_model = topology.power_model
+    loads = np.array([link.consumed_bandwidth for link in topology.links])
+    base_power = power_model.power(np.arange(len(loads)), loads)
+
     def evaluate_individual(individual):
-        latency = 0
-        power = 0
-        reliability = []
-        for idx in range(len(individual)-1):
-            link = topology.get_link_between_neighbors(individual[idx], individual[idx+1])
-            latency +=  link.latency 
-            power += (link.get_power_consumption(link.consumed_bandwidth+ flow['bandwidth'])-link.power_consumption_MORA) 
-            reliability.append(eval_bandwidth_single_link((link.consumed_bandwidth+ flow['bandwidth'])/link.total_bandwidth))
+        idx = topology.get_link_indices(individual)
+        new_loads = loads[idx] + flow['bandwidth']
+        latency = np.sum(topology.link_latencies[idx])
+        power = np.sum(power_model.power(idx, new_loads) - base_power[idx])
+        reliability = eval_bandwidth_links(new_loads/power_model.capacities[idx])
         return power, np.max(reliability), np.sum(reliability), latency
     return evaluate_individual
 
@@ -262,7 +275,7 @@ def get_optimize_route(topology, toolbox):
         stats.register("std", np.std, axis=0)
         stats.register("min", np.min, axis=0)
         stats.register("max", np.max, axis=0)
-        algorithms.eaSimple(pop, topology.toolbox, cxpb=0.75, mutpb=0.2, ngen=gen, stats=stats, halloffame=hof, verbose=False)
+        _, logbook = algorithms.eaSimple(pop, topology.toolbox, cxpb=0.75, mutpb=0.2, ngen=gen, stats=stats, halloffame=hof, verbose=False)
 
         min_attr = 1e15 
         meta_att = topology.meta_heuristic
@@ -275,6 +288,9 @@ def get_optimize_route(topology, toolbox):
         topology.toolbox.unregister("evaluate")
         topology.toolbox.unregister("population_fetch")
 
+        if topology.instrumentation is not None:
+            topology.instrumentation.record_mora(flow_dic, gen, sum(logbook.select('nevals')) + len(hof))
+
         return meta_best
         
     return optimize_route
\ No newline at end of file
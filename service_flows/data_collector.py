@@ -1,12 +1,19 @@
 # -*- coding: utf-8 -*-
 import sys
 sys.dont_write_bytecode
+import argparse
+import http.client
 import os
 import shutil
-import webbrowser
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
-from data_processor import process_data
+from urllib.parse import urlsplit
+try:
+    from data_processor import process_data  # run as a script
+except ImportError:
+    from service_flows.data_processor import process_data
 import csv
 
 # START DATE: 10 FEBBRAIO 2020 - GRAPH START = 1581292860
@@ -71,24 +78,34 @@ URLs = {
         "ATHR": ["https://tools.geant.org/portal/links/p-cacti/graph_xport.php?local_graph_id=47883&rra_id=0&view_type=tree&graph_start={}&graph_end={}".format(START_TIME, END_TIME), "vie-zag", 1],
     }
 
+# GEANT cacti server: the URLs above are relative to it (see get_url)
+DEFAULT_BASE_URL = 'https://tools.geant.org/portal/links/p-cacti/'
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
 def main():
-  
-    # Create Today's Data Folder
-    create_today_folder()
 
-    # Download Today's Data
-    download_data()
+    parser = argparse.ArgumentParser(description="Download and process yesterday's GEANT link data.")
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL, help='server to download from (e.g. a local stub server)')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent downloads')
+    parser.add_argument('--retries', type=int, default=3, help='retries per file')
+    args = parser.parse_args()
+
+    # Create Today's Data Folder
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    today_path = os.path.join(current_dir, create_today_folder())
 
-    # Move downloaded files in the correct folder
-    raw_data_path = move_downloaded_data()
+    # Download Today's Data (straight into today's folder)
+    _, failed = fetch_data(today_path, base_url=args.base_url, workers=args.workers, retries=args.retries)
+    for link in failed:
+        print(" *** {} NOT DOWNLOADED: {} *** ".format(link, failed[link]))
+    raw_data_path = os.path.join(current_dir, 'geant_daily_data')
 
     print(" *** FINISHED DOWNLOADING. PROCESSING RAW DATA... *** ")
 
-    current_dir = os.path.dirname(__file__)
-    raw_data_directories = sorted(next(os.walk(os.path.join(current_dir, 'geant_daily_data')))[1])
+    raw_data_directories = sorted(next(os.walk(raw_data_path))[1])
 
     for d in raw_data_directories:
-        raw_directory_path = os.path.join(current_dir, 'geant_daily_data', d)
+        raw_directory_path = os.path.join(raw_data_path, d)
         download_sanity_check(raw_directory_path)
 
     # Create Dataset Folder
@@ -100,11 +117,148 @@ def main():
     print(" *** PROCESSING COMPLETE. *** ")
 
 
-def download_data():
-    
-    for link in URLs:
-        webbrowser.open(URLs[link][0])
-        time.sleep(4)
+# ************ DOWNLOAD ************
+
+def get_url(link, base_url=DEFAULT_BASE_URL):
+    """
+    Returns the download URL of 'link' on the server at 'base_url'.
+
+    Arguments:
+        link {str} -- link name (key of URLs).
+
+    Keyword Arguments:
+        base_url {str} -- server (and path) replacing DEFAULT_BASE_URL (default: {DEFAULT_BASE_URL}).
+    """
+
+    return base_url.rstrip('/') + '/' + URLs[link][0][len(DEFAULT_BASE_URL):]
+
+def fetch_data(destination_path, base_url=DEFAULT_BASE_URL, workers=8, retries=3, backoff=1.0, timeout=30.0):
+    """
+    Downloads the data of every link in URLs to 'destination_path', with at most 'workers' concurrent requests.
+    Every worker thread keeps its connection to the server open across downloads.
+
+    Arguments:
+        destination_path {str} -- destination folder (e.g. geant_daily_data/<date>).
+
+    Keyword Arguments:
+        base_url {str} -- server to download from (default: {DEFAULT_BASE_URL}).
+        workers {int} -- concurrent downloads (default: {8}).
+        retries {int} -- retries of a failed download (default: {3}).
+        backoff {float} -- delay before the first retry [s], doubled at every retry (default: {1.0}).
+        timeout {float} -- socket timeout [s] (default: {30.0}).
+
+    Returns:
+        [tuple] -- ({link: downloaded file}, {link: error message}).
+    """
+
+    os.makedirs(destination_path, exist_ok=True)
+    downloaded, failed = {}, {}
+
+    def fetch(link):
+        try:
+            downloaded[link] = fetch_link(link, get_url(link, base_url), destination_path, retries, backoff, timeout)
+        except Exception as e:
+            failed[link] = str(e)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(fetch, URLs))
+    close_connections()
+
+    return downloaded, failed
+
+def fetch_link(link, url, destination_path, retries, backoff, timeout):
+    """
+    Downloads the data of 'link' from 'url', retrying (with exponential backoff) on connection errors
+    and on the HTTP statuses in RETRY_STATUS.
+
+    The file keeps the name given by the server (Content-Disposition) when it contains the link id,
+    otherwise it is named '<link name>_<link id>.csv'.
+
+    Returns:
+        [str] -- location of the downloaded file.
+    """
+
+    link_id = URLs[link][1]
+    error = None
+
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff * 2**(attempt - 1))
+        try:
+            status, headers, body = http_get(url, timeout)
+        except (OSError, http.client.HTTPException) as e:
+            error = repr(e)
+            continue
+        if status in RETRY_STATUS:
+            error = 'HTTP {}'.format(status)
+            continue
+        if status != 200:
+            raise Exception('*** {} FAILED: HTTP {} ***'.format(url, status))
+
+        filename = get_attachment_filename(headers)
+        if filename is None or link_id not in filename:
+            filename = '{}_{}.csv'.format(link, link_id)
+        file_path = os.path.join(destination_path, filename)
+        # Write atomically: a partial file would be taken for the link data
+        with open(file_path + '.part', 'wb') as f:
+            f.write(body)
+        os.replace(file_path + '.part', file_path)
+        return file_path
+
+    raise Exception('*** {} FAILED AFTER {} ATTEMPTS: {} ***'.format(url, retries + 1, error))
+
+def get_attachment_filename(headers):
+    # File name in the Content-Disposition header ('|' and path separators dropped), None if missing
+    disposition = headers.get('Content-Disposition', '')
+    for part in disposition.split(';'):
+        key, _, value = part.strip().partition('=')
+        if key.lower() == 'filename' and value:
+            return os.path.basename(value.strip().strip('"').replace('|', '_')) or None
+    return None
+
+# Persistent connections: (scheme, host) -> HTTP(S)Connection for every worker thread, all in _CONNECTIONS
+_LOCAL = threading.local()
+_CONNECTIONS = []
+_CONNECTIONS_LOCK = threading.Lock()
+
+def http_get(url, timeout):
+    """
+    GET 'url' on the (persistent) connection of the current thread to its server.
+
+    Returns:
+        [tuple] -- (status, headers, body).
+    """
+
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    if not hasattr(_LOCAL, 'connections'):
+        _LOCAL.connections = {}
+
+    connection = _LOCAL.connections.get(key)
+    if connection is None:
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        connection = _LOCAL.connections[key] = connection_class(parts.netloc, timeout=timeout)
+        with _CONNECTIONS_LOCK:
+            _CONNECTIONS.append(connection)
+
+    try:
+        connection.request('GET', (parts.path or '/') + ('?' + parts.query if parts.query else ''))
+        response = connection.getresponse()
+        body = response.read()
+    except (OSError, http.client.HTTPException):
+        # Drop the broken connection: the next attempt opens a new one
+        connection.close()
+        del _LOCAL.connections[key]
+        raise
+
+    return response.status, response.headers, body
+
+def close_connections():
+    # Closes the persistent connections of all the threads
+    with _CONNECTIONS_LOCK:
+        for connection in _CONNECTIONS:
+            connection.close()
+        del _CONNECTIONS[:]
 
 def download_sanity_check(raw_data_path):
 
@@ -140,24 +294,6 @@ def create_today_folder():
 
     return folder_name
 
-def move_downloaded_data():
-
-    source_path = '/home/' + os.getlogin() + '/Downloads'
-
-    current_dir = os.path.dirname(__file__)
-    today_string = str(date.today())
-    destination_folder = os.path.join(current_dir, 'geant_daily_data')
-    destination_path = os.path.join(destination_folder, today_string) 
-
-    files = os.listdir(source_path)
-
-    for f in files:
-        if f.endswith('.csv'):
-            source_file = os.path.join(source_path, f)
-            shutil.move(source_file, destination_path)
-
-    return destination_folder
-
 def create_allzero_file(path, link_id):
 
     files = sorted(os.listdir(path))
@@ -2,10 +2,11 @@
 import sys
 sys.dont_write_bytecode
 import os
-import shutil
 import json
+import multiprocessing
 from datetime import date
 import csv
+import numpy as np
 
 # START DATE: 10 FEBBRAIO 2020 - GRAPH START = 1581292860
 # STEP 86400 (= SECONDI IN UN GIORNO 60*60*24)
@@ -21,31 +22,105 @@ START_TIME = BEGINNING_OF_TIME + (DAYS-1) * STEP - 7200  # '7200' -> Begins two
 END_TIME = START_TIME + STEP + 7200
 
 
-def process_data(urls, raw_data_path, refined_data_path):
+def process_data(urls, raw_data_path, refined_data_path, workers=None):
+    """
+    Builds (or extends) the link files at 'refined_data_path' from the raw data directories (one per day)
+    at 'raw_data_path'.
 
-    raw_data_directories = sorted(next(os.walk(raw_data_path))[1])
+    The directories are ingested in memory on a pool of 'workers' processes, then every link file is merged with
+    the new rows, validated (see validate_data) and written once.
+
+    Arguments:
+        urls {dict} -- link name -> [url, link id, direction flag] (see main).
+        raw_data_path {str} -- location of the raw data directories.
+        refined_data_path {str} -- location of the link files.
+
+    Keyword Arguments:
+        workers {int} -- number of processes, all the cores by default (default: {None}).
+    """
 
     # ********* CREATE DATASET ******** #
-    for d in raw_data_directories:
-        source_path = os.path.join(raw_data_path, d)
-        files = os.listdir(source_path)
-    
-        ## FIND LINK FILE 
-        for link in urls:
-            link_id = urls[link][1]
-            for f in files:
-                if link_id in f:
-                    # Import Data
-                    csvfile = os.path.join(source_path, f)
-                    csvdata = import_csv(csvfile)
-                    # Export Data to correct location
-                    fname = link + '_' + link_id + '_traffic.csv'
-                    destination_path = os.path.join(refined_data_path, fname)
-                    export_csv(destination_path, csvdata[12:])
-    
-        ## VALIDATE DATA
-        validate_data(refined_data_path, urls)
-    
+    link_rows = load_link_rows(urls, raw_data_path, refined_data_path, workers)
+    for fname, rows in link_rows.items():
+        write_link_file(os.path.join(refined_data_path, fname), rows, get_heading(fname, urls))
+
+def load_link_rows(urls, raw_data_path, refined_data_path=None, workers=None):
+    """
+    Returns the (merged) rows of every link file, from the raw data directories at 'raw_data_path'
+    and, if given, from the link files already at 'refined_data_path' (nothing is written).
+
+    Arguments:
+        urls {dict} -- link name -> [url, link id, direction flag] (see main).
+        raw_data_path {str} -- location of the raw data directories.
+
+    Keyword Arguments:
+        refined_data_path {str} -- location of the existing link files (default: {None}).
+        workers {int} -- number of processes, all the cores by default (default: {None}).
+
+    Returns:
+        [dict] -- link file name -> rows (see merge_rows), empty if there are no raw data directories.
+    """
+
+    raw_data_directories = sorted(next(os.walk(raw_data_path))[1])
+    if not raw_data_directories:
+        return {}
+
+    # ********* INGEST RAW DATA ******** #
+    sources = [os.path.join(raw_data_path, d) for d in raw_data_directories]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(sources)))
+    if workers == 1:
+        ingested = [ingest_directory(source_path, urls) for source_path in sources]
+    else:
+        with multiprocessing.Pool(processes=workers) as pool:
+            ingested = pool.starmap(ingest_directory, [(source_path, urls) for source_path in sources])
+
+    # ********* MERGE ******** #
+    # Link file name -> rows, existing rows first, then the new ones in directory order
+    new_rows = {}
+    for directory_rows in ingested:
+        for fname, rows in directory_rows.items():
+            new_rows.setdefault(fname, []).extend(rows)
+
+    existing = os.listdir(refined_data_path) if refined_data_path is not None else []
+    link_rows = {}
+    for fname in sorted(set(existing) | set(new_rows)):
+        csvfile = os.path.join(refined_data_path, fname) if refined_data_path is not None else None
+        rows = merge_rows(import_csv(csvfile)) if fname in existing else {}
+        link_rows[fname] = merge_rows(new_rows.get(fname, []), rows)
+
+    return link_rows
+
+def index_directory(files, urls):
+    """
+    Returns the raw data files of every link (link id found in the file name).
+
+    Arguments:
+        files {list} -- file names of a raw data directory.
+        urls {dict} -- link name -> [url, link id, direction flag] (see main).
+
+    Returns:
+        [dict] -- link name -> list of file names (in 'files' order).
+    """
+
+    return {link: [f for f in files if urls[link][1] in f] for link in urls}
+
+def ingest_directory(source_path, urls):
+    """
+    Reads the raw data files of a directory.
+
+    Returns:
+        [dict] -- link file name -> rows (raw file headers excluded).
+    """
+
+    ingested = {}
+    for link, link_files in index_directory(os.listdir(source_path), urls).items():
+        for f in link_files:
+            # Import Data
+            csvdata = import_csv(os.path.join(source_path, f))
+            fname = link + '_' + urls[link][1] + '_traffic.csv'
+            ingested.setdefault(fname, []).extend(csvdata[12:])
+
+    return ingested
 
 def get_mean_link_bw():
     
@@ -100,11 +175,10 @@ def get_mean_link_bw():
 
     current_dir = os.path.dirname(__file__)
     raw_data_path = os.path.join(current_dir, 'geant_ctrl_data')
-    foo_dataset_path = create_folder('foo_dataset_geant')
 
-    # ********* CREATE FOO DATASET ******** #
+    # ********* LOAD CONTROL DATA (in memory) ******** #
     #
-    process_data(urls, raw_data_path, foo_dataset_path)
+    link_rows = load_link_rows(urls, raw_data_path)
     #
     # ********* CALCULATE LINKS' MEAN BANDWIDTH ******** #
     #
@@ -112,24 +186,17 @@ def get_mean_link_bw():
     links_mean_bw = {}
     
     ## FIND LINK FILE 
-    files = os.listdir(foo_dataset_path)
     for link in urls:
         link_id = urls[link][1]
-        for f in files:
-            if link_id in f:
-                # Import Data
-                csvfile = os.path.join(foo_dataset_path, f)
-                csvdata = import_csv(csvfile)
+        for fname in link_rows:
+            if link_id in fname:
+                # Link data, with heading
+                csvdata = [get_heading(fname, urls)] + list(link_rows[fname].values())
                 
                 # Compute link mean bandwidth
                 link_direction_1, link_direction_2 = compute_mean_bw(csvdata)
                 links_mean_bw.update({ link_direction_1[0] : link_direction_1[1] })
                 links_mean_bw.update({ link_direction_2[0] : link_direction_2[1] })
-    #
-    # ********* DELETE FOO DATASET ******** #
-    #
-    shutil.rmtree(foo_dataset_path)
-    #
 
     return links_mean_bw
  
@@ -160,59 +227,98 @@ def export_csv(path, data):
         for row in data:
             writer.writerow(row)
 
-def validate_data(path, urls):
+def validate_data(path, urls, workers=None):
+    """
+    Validates every link file at 'path' (in place), on a pool of 'workers' processes:
+    rows with the same date are merged (the last one wins, at the position of the first one),
+    'NaN' values are set to 0 and the heading is added if missing.
+
+    Arguments:
+        path {str} -- location of the link files.
+        urls {dict} -- link name -> [url, link id, direction flag] (see main).
+
+    Keyword Arguments:
+        workers {int} -- number of processes, all the cores by default (default: {None}).
+    """
 
-    
     files = os.listdir(path)
+    tasks = [(os.path.join(path, f), get_heading(f, urls)) for f in files]
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+    if workers == 1:
+        for task in tasks:
+            validate_file(*task)
+    else:
+        with multiprocessing.Pool(processes=workers) as pool:
+            pool.starmap(validate_file, tasks)
+
+def get_heading(f, urls):
+    """
+    Returns the heading of link file 'f', None if no link in 'urls' matches its name.
+    """
+
+    ## FIND LINK
+    for link in urls:
+        if urls[link][1] in f:
+            link_name = get_key_from_value(urls, urls[link][1])
+            eman_knil = link_name[len(link)//2:] + link[:len(link)//2]
+            # Check if data is coherent (straight = 1) or vice versa (reverse = 0)
+            if urls[link][2] == 1:
+                return ['DATE', '{}'.format(link_name), '{}_peak'.format(link_name), '{}'.format(eman_knil), '{}_peak'.format(link_name) ]
+            else:
+                return ['DATE', '{}'.format(eman_knil), '{}_peak'.format(eman_knil), '{}'.format(link_name), '{}_peak'.format(link_name) ]
+
+    return None
+
+def validate_file(csvfile, heading):
+    """
+    Validates a link file in one pass (see validate_data).
+
+    Arguments:
+        csvfile {str} -- location of the link file.
+        heading {list} -- heading row, inserted on top if the file has none.
+    """
 
-    for f in files:
-        ## IMPORT FILE DATA
-        csvfile = os.path.join(path, f)
-        csvdata = import_csv(csvfile)
-
-        ## DELETE DUPLICATE ROWS
-        # Find rows with same date and time
-        for i in range(len(csvdata)):
-            for j in range(len(csvdata[0:i])):
-                # if date is equal to previous row date
-                if csvdata[i][0] == csvdata[j][0]:
-                    # ...copy this row to that row
-                    csvdata[j] = csvdata[i]
-        # Delete all equal rows
-        foo_csvdata_set = set(tuple(x) for x in csvdata)
-        foo_csvdata = [list(x) for x in foo_csvdata_set]
-        foo_csvdata.sort(key = lambda x: csvdata.index(x))
-
-        csvdata = foo_csvdata.copy()
-
-        ## SET NaN ELEMENTS TO 0
-        for row in csvdata:
-            for index, value in enumerate(row):
-                if value == 'NaN':
-                    row[index] = '0'
-
-        ## ADD HEADING
-        # Find Link
-        for link in urls:
-            if urls[link][1] in f:
-                link_name = get_key_from_value(urls, urls[link][1])
-                eman_knil = link_name[len(link)//2:] + link[:len(link)//2]
-                # Check if data is coherent (straight = 1) or vice versa (reverse = 0)
-                if urls[link][2] == 1:
-                    heading = ['DATE', '{}'.format(link_name), '{}_peak'.format(link_name), '{}'.format(eman_knil), '{}_peak'.format(link_name) ]
-                else:
-                    heading = ['DATE', '{}'.format(eman_knil), '{}_peak'.format(eman_knil), '{}'.format(link_name), '{}_peak'.format(link_name) ]
-                break
-
-        # Insert heading on top
-        if csvdata[0][0] != 'DATE':
-            csvdata.insert(0, heading)
-
-        ## SAVE FILE
-        with open(csvfile, 'w') as csvf:
-            writer = csv.writer(csvf)
-            for row in csvdata:
-                writer.writerow(row)
+    ## IMPORT FILE DATA, DELETING DUPLICATE ROWS AND SETTING NaN ELEMENTS TO 0
+    with open(csvfile, "r", encoding="utf-8", errors="ignore") as scraped:
+        rows = merge_rows(row for row in csv.reader(scraped, delimiter=',') if row)  # avoid blank lines
+
+    ## SAVE FILE
+    write_link_file(csvfile, rows, heading)
+
+def merge_rows(rows, merged=None):
+    """
+    Adds 'rows' to 'merged' (date -> row), setting NaN elements to 0.
+
+    A dict keeps the position of the first row with a date, assignment keeps the last row.
+
+    Returns:
+        [dict] -- 'merged' (a new dict if None).
+    """
+
+    merged = {} if merged is None else merged
+    for row in rows:
+        merged[row[0]] = ['0' if value == 'NaN' else value for value in row]
+
+    return merged
+
+def write_link_file(csvfile, rows, heading):
+    """
+    Writes the (merged) rows of a link file, with heading on top.
+
+    Arguments:
+        csvfile {str} -- location of the link file.
+        rows {dict} -- date -> row (see merge_rows).
+        heading {list} -- heading row, inserted on top if the first row is not a heading.
+    """
+
+    with open(csvfile, 'w') as csvf:
+        writer = csv.writer(csvf)
+        if not rows or next(iter(rows)) != 'DATE':
+            if heading is None:
+                raise Exception('*** NO LINK MATCHES FILE {} ***'.format(csvfile))
+            writer.writerow(heading)
+        writer.writerows(rows.values())
 
 def get_key_from_value(dictionary, val):
     
@@ -225,15 +331,11 @@ def compute_mean_bw(data):
     direction_1 = data[0][1]
     direction_2 = data[0][3]
 
-    direction_1_sum_bw = 0.0
-    direction_2_sum_bw = 0.0
-
-    for i in range(1, len(data)):
-
-        direction_1_sum_bw += float(data[i][1])
-        direction_2_sum_bw += float(data[i][3])
+    bw = np.array([(row[1], row[3]) for row in data[1:]], dtype=float)
+    # cumsum adds in row order, as a Python loop would (np.sum adds pairwise): the sums are the same floats
+    direction_1_sum_bw, direction_2_sum_bw = np.cumsum(bw, axis=0)[-1]
     
-    return [(direction_1, direction_1_sum_bw//(len(data)-1)), (direction_2, direction_2_sum_bw//(len(data)-1))]      
+    return [(direction_1, float(direction_1_sum_bw//(len(data)-1))), (direction_2, float(direction_2_sum_bw//(len(data)-1)))]      
 
 def write_to_json(data, filename, json_path):
     """
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.dont_write_bytecode
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Local stand-in for the GEANT cacti server: serves the link files of a raw data directory
+# (e.g. geant_daily_data/<date>) at the URLs used by data_collector.py.
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, as the real server
+
+    def do_GET(self):
+        server = self.server
+        query = parse_qs(urlsplit(self.path).query)
+        graph_id = query.get('local_graph_id', [None])[0]
+        file_path = server.files.get(graph_id)
+
+        with server.lock:
+            server.requests += 1
+            failing = server.failures.get(graph_id, 0) > 0
+            if failing:
+                server.failures[graph_id] -= 1
+
+        if file_path is None:
+            self.send_error(404)
+            return
+        if failing:
+            self.send_error(503)
+            return
+
+        with open(file_path, 'rb') as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Disposition', 'attachment; filename="{}"'.format(os.path.basename(file_path)))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Quiet: one line per request would flood the output
+        pass
+
+
+def make_server(source_path, urls, host='127.0.0.1', port=0, failures=0):
+    """
+    Returns a stub server (not started) serving the link files found at 'source_path'.
+
+    Arguments:
+        source_path {str} -- raw data directory (one file per link, the link id in its name).
+        urls {dict} -- link name -> [url, link id, direction flag] (see data_collector.py).
+
+    Keyword Arguments:
+        host {str} -- interface to listen on (default: {'127.0.0.1'}).
+        port {int} -- port to listen on, a free one if 0 (default: {0}).
+        failures {int} -- requests answered with HTTP 503 before serving each file, to test retries (default: {0}).
+
+    Returns:
+        [ThreadingHTTPServer] -- the server; its base URL is get_base_url(server).
+    """
+
+    files = sorted(os.listdir(source_path))
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.files = {}  # graph id -> file
+    for link in urls:
+        graph_id = parse_qs(urlsplit(urls[link][0]).query)['local_graph_id'][0]
+        for f in files:
+            if urls[link][1] in f:
+                server.files[graph_id] = os.path.join(source_path, f)
+                break
+    server.failures = {graph_id: failures for graph_id in server.files}
+    server.requests = 0
+    server.lock = threading.Lock()
+
+    return server
+
+def get_base_url(server):
+    host, port = server.server_address[:2]
+    return 'http://{}:{}/'.format(host, port)
+
+def start_server(source_path, urls, **kwargs):
+    """
+    Starts a stub server (see make_server) in a background thread.
+
+    Returns:
+        [ThreadingHTTPServer] -- the running server (stop it with server.shutdown()).
+    """
+
+    server = make_server(source_path, urls, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def main():
+
+    # Usage: python -m service_flows.geant_stub_server <raw data directory> [port]
+    from service_flows.data_collector import URLs
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8000
+    server = make_server(sys.argv[1], URLs, port=port)
+    print(" *** SERVING {} LINK FILES AT {} *** ".format(len(server.files), get_base_url(server)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
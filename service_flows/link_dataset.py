@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.dont_write_bytecode
+import os
+import numpy as np
+from service_flows.data_processor import import_csv
+
+# Members of the .npz store that are not link columns
+INDEX_MEMBERS = ('timestamps', 'link_names')
+
+
+class LinkDataset:
+
+    def __init__(self, timestamps, columns):
+        """
+        Initialization Method of LinkDataset object: link throughputs [bps] as a columnar time series,
+        one column per directed link id on a shared timestamp index.
+
+        Arguments:
+            timestamps {list} -- T timestamps, sorted (strings, e.g. '2020-04-01 00:05:00').
+            columns {dict} -- directed link id -> T float array (NaN where the link has no sample);
+                either in memory or the lazily read members of a .npz store.
+        """
+
+        self.timestamps = np.array([str(t) for t in timestamps], dtype=str)
+        self.columns = columns
+        self.link_names = [l for l in (columns.files if hasattr(columns, 'files') else columns) \
+                           if l not in INDEX_MEMBERS]
+        self._cache = {}  # link id -> column read from the store
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @classmethod
+    def from_directory(cls, path):
+        """
+        Packs a directory of link files (one CSV per physical link, 'DATE,dir1,dir1_peak,dir2,dir2_peak'
+        with heading, see service_flows/data_processor.py).
+
+        Both directions of every file become a column named as in the file heading; peak columns are not kept.
+        The timestamp index is the union of the timestamps of all the files.
+
+        Arguments:
+            path {str} -- location of the link files.
+
+        Returns:
+            [LinkDataset] -- the packed dataset.
+        """
+
+        series = {}  # directed link id -> {timestamp: throughput}
+        for f in sorted(os.listdir(path)):
+            if not f.endswith('.csv'):
+                continue
+            csvdata = import_csv(os.path.join(path, f))
+            if not csvdata or csvdata[0][0] != 'DATE':
+                raise Exception('*** {} HAS NO HEADING ***'.format(f))
+            heading = csvdata[0]
+            for col in (1, 3):
+                series[heading[col]] = {row[0]: row[col] for row in csvdata[1:]}
+
+        timestamps = sorted(set(t for samples in series.values() for t in samples))
+        index = {t: i for i, t in enumerate(timestamps)}
+        columns = {}
+        for link, samples in series.items():
+            column = np.full(len(timestamps), np.nan)
+            column[[index[t] for t in samples]] = np.array(list(samples.values()), dtype=float)
+            columns[link] = column
+
+        return cls(timestamps, columns)
+
+    @classmethod
+    def load(cls, store_path):
+        """
+        Opens a dataset saved with save. Only the index is read: every column is read the first time it is requested.
+
+        Arguments:
+            store_path {str} -- location of the .npz file.
+
+        Returns:
+            [LinkDataset] -- the dataset.
+        """
+
+        if not store_path.endswith('.npz'):
+            raise Exception('*** {} IS NOT A LINK DATASET (.npz) ***'.format(store_path))
+
+        columns = np.load(store_path, allow_pickle=False)
+        return cls(columns['timestamps'].tolist(), columns)
+
+    def save(self, store_path):
+        """
+        Writes the dataset to 'store_path' (.npz, one member per column plus the index).
+
+        Arguments:
+            store_path {str} -- destination file.
+        """
+
+        if not store_path.endswith('.npz'):
+            raise Exception('*** {} IS NOT A LINK DATASET (.npz) ***'.format(store_path))
+
+        columns = {link: self.get_link(link) for link in self.link_names}
+        np.savez(store_path, timestamps=self.timestamps, link_names=np.array(self.link_names, dtype=str), **columns)
+
+    # ************ READ ************
+
+    def get_range(self, start=None, stop=None):
+        """
+        Returns the slice of the timestamp index from 'start' (included) to 'stop' (excluded).
+
+        Keyword Arguments:
+            start {str} -- first timestamp, from the beginning if None (default: {None}).
+            stop {str} -- end timestamp, to the end if None (default: {None}).
+
+        Returns:
+            [slice] -- positions in the timestamp index.
+        """
+
+        # Timestamps are ISO strings: lexicographic order is chronological
+        i = 0 if start is None else int(np.searchsorted(self.timestamps, str(start), side='left'))
+        j = len(self.timestamps) if stop is None else int(np.searchsorted(self.timestamps, str(stop), side='left'))
+        return slice(i, max(i, j))
+
+    def get_timestamps(self, start=None, stop=None):
+        """
+        Returns the timestamps from 'start' (included) to 'stop' (excluded).
+        """
+
+        return self.timestamps[self.get_range(start, stop)].tolist()
+
+    def get_link(self, link, start=None, stop=None):
+        """
+        Returns the throughputs [bps] of directed link 'link' from 'start' (included) to 'stop' (excluded).
+
+        Arguments:
+            link {str} -- directed link id.
+
+        Returns:
+            [np.ndarray] -- throughputs, NaN where the link has no sample.
+        """
+
+        if link not in self._cache:
+            if link not in self.link_names:
+                raise Exception('*** NO LINK {} IN THE DATASET ***'.format(link))
+            self._cache[link] = np.asarray(self.columns[link], dtype=float)
+
+        return self._cache[link][self.get_range(start, stop)]
+
+    def get_links(self, links, start=None, stop=None):
+        """
+        Returns the throughputs [bps] of 'links' from 'start' (included) to 'stop' (excluded).
+
+        Arguments:
+            links {list} -- directed link ids.
+
+        Returns:
+            [np.ndarray] -- T x len(links) matrix (columns ordered as 'links').
+        """
+
+        window = self.get_range(start, stop)
+        B = np.zeros((window.stop - window.start, len(links)))
+        for i, link in enumerate(links):
+            B[:, i] = self.get_link(link)[window]
+
+        return B
+
+
+def pack_dataset(path, store_path):
+    """
+    Converts the link files in 'path' into a single columnar store.
+
+    Arguments:
+        path {str} -- location of the link files.
+        store_path {str} -- destination file (.npz).
+
+    Returns:
+        [LinkDataset] -- the packed dataset.
+    """
+
+    dataset = LinkDataset.from_directory(path)
+    dataset.save(store_path)
+
+    return dataset
+
+
+def main():
+
+    # Usage: python -m service_flows.link_dataset <link files dir> <store file (.npz)>
+    dataset = pack_dataset(sys.argv[1], sys.argv[2])
+    print(" *** {} SAMPLES x {} LINKS PACKED TO {} *** ".format(len(dataset), len(dataset.link_names), sys.argv[2]))
+
+
+if __name__ == "__main__":
+    main()
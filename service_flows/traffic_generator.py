@@ -3,16 +3,31 @@ import sys
 sys.dont_write_bytecode
 import json
 import threading
+import random
+import queue
 import time, datetime
 import os
 import pandas as pd
 import numpy as np
+from service_flows.traffic_tensor import TrafficTensor
 
 np.random.seed(64)
 
+SERVICE_CLASSES = ('premium', 'assured', 'besteffort')
+
+# Structured flow table: one row per (src, dst, service class) flow, see build_flow_table
+FLOW_DTYPE = np.dtype([
+    ('src', np.int32),              # source node index
+    ('dst', np.int32),              # destination node index
+    ('service_class', np.int8),     # index in SERVICE_CLASSES
+    ('bandwidth', np.float64),      # Mbps
+    ('latency', np.float64)         # latency bound [ms]
+])
+
 class TrafficGenerator():
 
-    def __init__(self, interval, topology, path, faults = 0, traffic_boost = 0):
+    def __init__(self, interval, topology, path, faults = 0, traffic_boost = 0, autostart = True, mode = 'realtime', prefetch = 2, log_file_name = None, instrumentation = None, \
+                 checkpoint_path = None, checkpoint_every = 1, resume_from = None):
         """
         Initialization Method of Traffic Generator.
 
@@ -20,10 +35,27 @@ class TrafficGenerator():
         Args:
             interval (int): elapsed seconds between two traffic files. 
             topology (Topology): topology on which the traffic is injected.
-            path (string): location of the traffic files.
+            path (string): location of the traffic files, or of a traffic tensor (.npy/.npz, see traffic_tensor).
             faults (int, optional): [description]. Defaults to 0.
             traffic_boost (int, optional): percent increase of bandwidth value. Defaults to 0.
+            autostart (bool, optional): start generate_flows in a separate thread. Defaults to True.
+            mode (string, optional): 'realtime' (one traffic file every 'interval' seconds) or
+                'fast-forward' (no sleep, simulated clock only). Defaults to 'realtime'.
+            prefetch (int, optional): number of traffic files read and converted into flows ahead of
+                the current one by a reader thread (0 disables prefetching). Defaults to 2.
+            log_file_name (string, optional): location of the CSV log. Defaults to
+                "log_<starting time>_<routing method>.csv" in the current directory.
+            instrumentation (Instrumentation, optional): records phase durations and flow routing latencies
+                (see utils/instrumentation.py). Defaults to None (disabled).
+            checkpoint_path (string, optional): location of the checkpoint written every 'checkpoint_every'
+                iterations (see save_checkpoint). Defaults to None (no checkpoints).
+            checkpoint_every (int, optional): checkpoint period [iterations]. Defaults to 1.
+            resume_from (string, optional): checkpoint to resume the simulation from, on a new topology built
+                with the same routing method; the log file is truncated at the checkpoint. Defaults to None.
         """
+        if mode not in ('realtime', 'fast-forward'):
+            raise Exception('*** {} IS NOT A VALID MODE! ***'.format(mode))
+
         #### CONSTANT PARAMETERS ####
         self.p_part = 0.19
         self.a_part = 0.64
@@ -32,144 +64,488 @@ class TrafficGenerator():
         self.premium_thresh = 150 #ms
         self.assured_thresh = 400 #ms
 
+        # Bandwidth threshold: if two flows with equal source-destination are found between
+        # two time intervals, check their bandwidth
+        # If difference > threshold, then consider them as different flows
+        self.bw_delta_thrs = 100  # Mbps
+
         #### ATTRIBUTES ####
         self.flows = {}
         self.interval = interval
         self.topo = topology
+        self.topo.instrumentation = instrumentation
+        self.instrumentation = instrumentation
         self.old_path_archive = []
         self.new_path_archive = []
 
+        #### PROGRESS ####
+        self.mode = mode
+        self.iteration = 0          # number of completed iterations
+        self.sim_time = 0           # simulated clock [s]
+        self.callbacks = []         # called as callback(traffic_generator, iteration) after every iteration
+        self.done = threading.Event()
+        self.thread = None
+
+        #### CHECKPOINTS ####
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+
         #### TRAFFIC MATRICES ####
         self.path = path
+        self.prefetch = prefetch
+        self.prefetch_queue = None
+        self.prefetch_stop = threading.Event()
 
         #### TRAFFIC BOOST ####
         self.traffic_boost = 1.0 + traffic_boost / 100
 
-        # Get Traffic files & sort them
-        self.traffic_files = [f for f in os.listdir(self.path)]
-        self.traffic_files.sort(key=str.lower)
+        # Get Traffic files & sort them (or the samples of a traffic tensor)
+        if os.path.isfile(self.path):
+            self.tensor = TrafficTensor.load(self.path)
+            self.traffic_files = self.tensor.timestamps
+        else:
+            self.tensor = None
+            self.traffic_files = [f for f in os.listdir(self.path)]
+            self.traffic_files.sort(key=str.lower)
 
         # Program node faults
         self.faults_number = faults
         self.fault_generator()
-        # Create thread
-        thread = threading.Thread(target=self.generate_flows, args=())
-        thread.daemon = True
-        thread.start()
-
         ### LOGGING ###
         self.last_elapsed = 0
         self.log_idx = 0
         self.starting_time = datetime.datetime.now()
-        self.log_file_name = "log_{}_{}.csv".format(\
+        if log_file_name is None and resume_from is not None:
+            log_file_name = read_from_json(resume_from)['log_file_name']
+        if log_file_name is None:
+            log_file_name = "log_{}_{}.csv".format(\
                 self.starting_time.strftime("%Y-%m-%d %H:%M:%S"), topology.routing_method)
+        self.log_file_name = log_file_name
         self.log_cols = ['Routing algorithm', 'Power consumption [W]', 'Reliability score (Max)',\
                             'Reliability score (# above 60%)', 'Mean latency (premium) [ms]',\
                             'Mean latency (assured) [ms]', 'Premium SLA violations',\
                                  'Assured SLA violations', 'Time', 'Link usage']
-        df = pd.DataFrame(columns=self.log_cols)
-        df.to_csv(self.log_file_name, mode='w', header=True, index=False)
+        if resume_from is not None:
+            self.load_checkpoint(resume_from)
+        else:
+            df = pd.DataFrame(columns=self.log_cols)
+            df.to_csv(self.log_file_name, mode='w', header=True, index=False)
+
+        # Create thread
+        if autostart:
+            self.start()
+
+    def start(self):
+        """
+        Starts generate_flows in a separate (daemon) thread.
+        """
+
+        self.thread = threading.Thread(target=self.generate_flows, args=())
+        self.thread.daemon = True
+        self.thread.start()
+
+    def join(self, timeout=None):
+        """
+        Waits for the simulation to complete.
+
+        Args:
+            timeout (float, optional): maximum waiting time [s]. Defaults to None (no limit).
+
+        Returns:
+            [bool]: True if the simulation is complete.
+        """
+
+        if self.thread is not None:
+            self.thread.join(timeout)
+        return self.done.is_set()
+
+    def add_callback(self, callback):
+        """
+        Registers a function called as callback(traffic_generator, iteration) at the end of every iteration.
+        """
+
+        self.callbacks.append(callback)
+
+    def progress(self):
+        """
+        Returns the progress of the simulation.
+
+        Returns:
+            [tuple]: (completed iterations, number of traffic files).
+        """
+
+        return self.iteration, len(self.traffic_files)
 
     def generate_flows(self):
         """
-        
+        Injects every traffic file on the topology (thread target, see start).
         """
 
-        i = 0
-        
-        while i < len(self.traffic_files):
-            
-            flows = {}
+        self.run()
+
+    def run(self):
+        """
+        Synchronously injects every traffic file on the topology and returns when the simulation is complete.
+        """
+
+        for _ in self.iterations():
+            pass
+
+    def iterations(self):
+        """
+        Generator running the simulation one traffic file at a time.
+
+        In 'realtime' mode every iteration lasts (at least) 'interval' seconds, as the traffic files are
+        injected at the same pace they were sampled; in 'fast-forward' mode the iterations run back-to-back.
+        In both modes the simulated clock 'sim_time' advances by 'interval' seconds per traffic file.
+
+        Yields:
+            [int]: index of the completed iteration.
+        """
 
+        if self.prefetch > 0:
+            self.start_prefetch(self.iteration)
+
+        try:
+            yield from self._iterations()
+        finally:
+            self.stop_prefetch()
+
+        self.done.set()
+
+    def _iterations(self):
+        while self.iteration < len(self.traffic_files):
+            i = self.iteration
             beginning_of_iteration = time.time()
             print('******* GENERATE_FLOWS -> ITERATION {} OUT OF {} *******'.format(i+1, len(self.traffic_files)))
-            
+
             now = datetime.datetime.now()
             print('++++ BEGINNING OF ITERATION @ {} ++++'.format(now.strftime("%m/%d/%Y, %H:%M:%S")))
             print('')
-            
-            print('#### NODE FAILURES PHASE... execution time = ', end='')          
-            #
-            ## NODE FAILURES ####################################################################
-            #
-            start_time = time.time()
-            # Check if any node will fail
-            disrupted_flows_ids = []
-            for _, fault in enumerate(self.faults):
-                if fault[0] == i:
-                    disrupted_flows_ids.extend(self.topo.shutdown_node(fault[1]))
-                    self.topo.faulty_node_list.append(fault[1])     
-            #
-            print("{}".format(time.time() - start_time))
-            #
-            ####################################################################################
-            #
-            print('#### DISRUPTED FLOWS REROUTING PHASE... execution time = ', end='')          
-            #
-            ## DISRUPTED FLOWS REROUTING #######################################################
-            #
-            if disrupted_flows_ids:
-                # Remove duplicates in disrupted_flows_ids
-                disrupted_flows_ids = list(set(disrupted_flows_ids))
-                opa = self.old_path_archive.copy()  # make a copy of self.old_path_archive
-                
-                # 1) Find disrupted_flow in old_path_archive
-                # 2) Remove it from old_path_archive
-                # 3) Add it to flows, so that it will be rerouted
-                # 4) Remove it from all the other network links
-                for disrupted_flow_id in disrupted_flows_ids:    
-                    for flow in self.old_path_archive:
-                        if flow[0]['_id'] == disrupted_flow_id:  # 1)
-                            opa.remove(flow)  # 2)
-                            flows[disrupted_flow_id] = flow[0]  # 3)
-                            self.topo.clear_flow_from_network(flow[0])  # 4)
-                # Update old_path_arhive
-                self.old_path_archive = opa
-                #
-                self.flows = flows
-                self.apply_flows()
-                flows = {}
-            #
-            print("{}".format(time.time() - start_time))
-            #
-            ###################################################################################
-            #
-            print('#### GENERATE NEW FLOWS PHASE... execution time = ', end='')          
-            #
-            ## GENERATE NEW FLOWS #############################################################
-            #
-            f_path = os.path.join(self.path, self.traffic_files[i])
-            f = read_from_json(f_path)
-
-            for src in f:
-                for dst in f[src]:
-                    bw = self.traffic_boost * round(f[src][dst]/1000000,0)  # Get traffic bandwidth from src to dst and convert in Mbps
-                    if bw > 0:
-                        bw_p = round(self.p_part * bw, 3)  # premium bandwidth
-                        bw_a = round(self.a_part * bw, 3)  # assured bandwidth
-                        bw_be = round(self.be_part * bw, 3)  # best effort bandwidth
-                        flows['{}{}{}'.format(src, dst, 'premium')] = self.get_flow(service_class='premium', bandwidth=bw_p, nodeA=src, nodeB=dst)
-                        flows['{}{}{}'.format(src, dst, 'assured')] = self.get_flow(service_class='assured', bandwidth=bw_a, nodeA=src, nodeB=dst)
-                        flows['{}{}{}'.format(src, dst, 'besteffort')] = self.get_flow(service_class='besteffort', bandwidth=bw_be, nodeA=src, nodeB=dst)
-            self.flows = flows
-            i+=1
-            self.apply_flows()
-            #
-            print("{}".format(time.time() - start_time))
-            #
-            ####################################################################################
-            #
+
+            self.run_iteration(i)
+            self.iteration += 1
+            self.sim_time += self.interval
+
             now = datetime.datetime.now()
             print('++++ END OF ITERATION @ {} ++++'.format(now.strftime("%m/%d/%Y, %H:%M:%S")))
-            print('******* GENERATE_FLOWS -> ITERATION {} OUT OF {} ELAPSED TIME = {} *******'.format(i, len(self.traffic_files), time.time() - beginning_of_iteration))
+            print('******* GENERATE_FLOWS -> ITERATION {} OUT OF {} ELAPSED TIME = {} *******'.format(self.iteration, len(self.traffic_files), time.time() - beginning_of_iteration))
             self.last_elapsed = time.time() - beginning_of_iteration
-            try:
-                time.sleep(self.interval - (time.time() - beginning_of_iteration))
-            except:
-                print('******* INTERVAL EXCEEDED BY {} SECONDS *******'.format(time.time() - beginning_of_iteration - self.interval))
+
+            if self.checkpoint_path is not None and self.iteration % self.checkpoint_every == 0:
+                self.save_checkpoint(self.checkpoint_path)
+
+            for callback in self.callbacks:
+                callback(self, i)
+
+            if self.mode == 'realtime':
+                try:
+                    time.sleep(self.interval - (time.time() - beginning_of_iteration))
+                except:
+                    print('******* INTERVAL EXCEEDED BY {} SECONDS *******'.format(time.time() - beginning_of_iteration - self.interval))
             print('--------------------------------------------------------------------------')
             print('')
+
+            yield i
+
+    def save_checkpoint(self, checkpoint_path):
+        """
+        Writes a checkpoint of the simulation (compact JSON, replaced atomically): iteration, simulated clock,
+        fault schedule, applied flows with their paths, topology operational state, NumPy and Python
+        RNG states and log offset.
+
+        Args:
+            checkpoint_path (string): location of the checkpoint.
+        """
+
+        np_state = np.random.get_state()
+        py_state = random.getstate()
+        checkpoint = {
+            "routing_method": self.topo.routing_method,
+            "traffic_files": len(self.traffic_files),
+            "traffic_boost": self.traffic_boost,
+            "iteration": self.iteration,
+            "sim_time": self.sim_time,
+            "last_elapsed": self.last_elapsed,
+            "faults": [[int(t), node] for t, node in self.faults],
+            "archive": [[flow, path] for flow, path in self.old_path_archive],
+            "topology": self.topo.get_state(),
+            "np_random_state": [np_state[0], np_state[1].tolist(), int(np_state[2]), int(np_state[3]), float(np_state[4])],
+            "random_state": [py_state[0], list(py_state[1]), py_state[2]],
+            "log_file_name": self.log_file_name,
+            "log_offset": os.path.getsize(self.log_file_name)
+        }
+
+        tmp_path = checkpoint_path + '.tmp'
+        with open(tmp_path, 'w+') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, checkpoint_path)
+
+    def load_checkpoint(self, checkpoint_path):
+        """
+        Restores a checkpoint written by save_checkpoint: the simulation continues from the next iteration
+        exactly as the checkpointed one would have.
+
+        Args:
+            checkpoint_path (string): location of the checkpoint.
+        """
+
+        checkpoint = read_from_json(checkpoint_path)
+
+        if checkpoint["routing_method"] != self.topo.routing_method:
+            raise Exception('*** CHECKPOINT ROUTING METHOD IS {} ***'.format(checkpoint["routing_method"]))
+        if checkpoint["traffic_files"] != len(self.traffic_files) or checkpoint["traffic_boost"] != self.traffic_boost:
+            raise Exception('*** CHECKPOINT TRAFFIC DOES NOT MATCH {} ***'.format(self.path))
+
+        self.iteration = checkpoint["iteration"]
+        self.sim_time = checkpoint["sim_time"]
+        self.last_elapsed = checkpoint["last_elapsed"]
+        self.faults = [(t, node) for t, node in checkpoint["faults"]]
+        self.old_path_archive = [(flow, path) for flow, path in checkpoint["archive"]]
+        self.topo.set_state(checkpoint["topology"], {flow['_id']: (flow, path) for flow, path in self.old_path_archive})
+
+        name, keys, pos, has_gauss, cached_gaussian = checkpoint["np_random_state"]
+        np.random.set_state((name, np.array(keys, dtype=np.uint32), pos, has_gauss, cached_gaussian))
+        version, state, gauss_next = checkpoint["random_state"]
+        random.setstate((version, tuple(state), gauss_next))
+
+        # Drop the log rows written after the checkpoint
+        with open(self.log_file_name, 'r+') as f:
+            f.truncate(checkpoint["log_offset"])
+
+    def run_iteration(self, i):
+        """
+        Injects the i-th traffic file: node failures, rerouting of the disrupted flows and routing of the new flows.
+
+        Args:
+            i (int): index of the traffic file.
+        """
+
+        flows = {}
+        instr = self.instrumentation
+        if instr is not None:
+            instr.iteration = i
+            phase_start = instr.now()
+
+        print('#### NODE FAILURES PHASE... execution time = ', end='')          
+        #
+        ## NODE FAILURES ####################################################################
+        #
+        start_time = time.time()
+        # Check if any node will fail
+        disrupted_flows_ids = []
+        for _, fault in enumerate(self.faults):
+            if fault[0] == i:
+                disrupted_flows_ids.extend(self.topo.shutdown_node(fault[1]))
+                self.topo.faulty_node_list.append(fault[1])     
+        #
+        print("{}".format(time.time() - start_time))
+        if instr is not None:
+            instr.record_phase('node failures', phase_start)
+            phase_start = instr.now()
+        #
+        ####################################################################################
+        #
+        print('#### DISRUPTED FLOWS REROUTING PHASE... execution time = ', end='')          
+        #
+        ## DISRUPTED FLOWS REROUTING #######################################################
+        #
+        if disrupted_flows_ids:
+            # Remove duplicates in disrupted_flows_ids
+            disrupted_flows_ids = list(set(disrupted_flows_ids))
+            opa = self.old_path_archive.copy()  # make a copy of self.old_path_archive
             
+            # 1) Find disrupted_flow in old_path_archive
+            # 2) Remove it from old_path_archive
+            # 3) Add it to flows, so that it will be rerouted
+            # 4) Remove it from all the other network links
+            for disrupted_flow_id in disrupted_flows_ids:    
+                for flow in self.old_path_archive:
+                    if flow[0]['_id'] == disrupted_flow_id:  # 1)
+                        opa.remove(flow)  # 2)
+                        flows[disrupted_flow_id] = flow[0]  # 3)
+                        self.topo.clear_flow_from_network(flow[0])  # 4)
+            # Update old_path_arhive
+            self.old_path_archive = opa
+            #
+            self.flows = flows
+            self.apply_flows()
+            flows = {}
+        #
+        print("{}".format(time.time() - start_time))
+        if instr is not None:
+            instr.record_phase('disrupted flows rerouting', phase_start)
+            phase_start = instr.now()
+        #
+        ###################################################################################
+        #
+        print('#### GENERATE NEW FLOWS PHASE... execution time = ', end='')          
+        #
+        ## GENERATE NEW FLOWS #############################################################
+        #
+        node_names, table = self.get_flow_batch(i)
+        self.apply_flow_table(table, node_names)
+        #
+        print("{}".format(time.time() - start_time))
+        if instr is not None:
+            instr.record_phase('new flows', phase_start)
+        #
+        ####################################################################################
+        #
+        self.log_stats()
+
+    def start_prefetch(self, start):
+        """
+        Starts the reader thread, which converts traffic files 'start', 'start'+1, ... into flows
+        and hands them over through a queue holding at most 'prefetch' batches.
+
+        Args:
+            start (int): index of the first traffic file.
+        """
+
+        self.prefetch_stop = threading.Event()
+        self.prefetch_queue = queue.Queue(maxsize=self.prefetch)
+        reader = threading.Thread(target=self._prefetch_files, args=(start, self.prefetch_queue, self.prefetch_stop))
+        reader.daemon = True
+        reader.start()
+
+    def stop_prefetch(self):
+        """
+        Stops the reader thread (if any) and drops the prefetched batches.
+        """
+
+        self.prefetch_stop.set()
+        self.prefetch_queue = None
+
+    def _prefetch_files(self, start, batches, stop):
+        for i in range(start, len(self.traffic_files)):
+            try:
+                flows = self.get_flow_table(i)
+            except Exception as e:
+                flows = e  # re-raised by get_flow_batch
+            # Wait for a free slot, unless the simulation is over
+            while not stop.is_set():
+                try:
+                    batches.put((i, flows), timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if stop.is_set() or isinstance(flows, Exception):
+                return
+
+    def get_flow_batch(self, i):
+        """
+        Returns the flow table of the i-th traffic file, from the prefetch queue if the reader thread is running.
+
+        Args:
+            i (int): index of the traffic file.
+
+        Returns:
+            [tuple]: (node names, flow table), see get_flow_table.
+        """
+
+        if self.prefetch_queue is None:
+            return self.get_flow_table(i)
+
+        j, flows = self.prefetch_queue.get()
+        if isinstance(flows, Exception):
+            raise flows
+        if j != i:
+            raise Exception('*** PREFETCHED TRAFFIC FILE {} INSTEAD OF {} ***'.format(j, i))
+
+        return flows
+
+    def get_traffic_matrix(self, i):
+        """
+        Reads the i-th traffic file (or tensor sample) as an array.
+
+        Args:
+            i (int): index of the traffic file.
+
+        Returns:
+            [tuple]: (node names, N x N traffic matrix [bps]).
+        """
+
+        if self.tensor is not None:
+            return self.tensor.node_names, self.tensor.matrices[i]
+
+        f_path = os.path.join(self.path, self.traffic_files[i])
+        f = read_from_json(f_path)
+
+        node_names = set(f)
+        for src in f:
+            node_names.update(f[src])
+        node_names = sorted(node_names)
+        node_index = {name: j for j, name in enumerate(node_names)}
+
+        matrix = np.zeros((len(node_names), len(node_names)))
+        for src in f:
+            for dst, value in f[src].items():
+                matrix[node_index[src], node_index[dst]] = value
+
+        return node_names, matrix
+
+    def get_flow_table(self, i):
+        """
+        Returns the flow table of the i-th traffic file (or tensor sample), see build_flow_table.
+
+        Args:
+            i (int): index of the traffic file.
+
+        Returns:
+            [tuple]: (node names, flow table).
+        """
+
+        node_names, matrix = self.get_traffic_matrix(i)
+        parts = [self.p_part, self.a_part, self.be_part]
+        latencies = [self.class_performance_constraints(c)['latency'] for c in SERVICE_CLASSES]
+
+        return node_names, build_flow_table(matrix, self.traffic_boost, parts, latencies)
+
+    def get_flows_from_table(self, table, node_names):
+        """
+        Converts (rows of) a flow table into service flows, as returned by get_flow.
+
+        Args:
+            table (np.ndarray): flow table.
+            node_names (list): node names, indexed by the 'src'/'dst' columns.
+
+        Returns:
+            [dict]: flows, indexed by flow id.
+        """
+
+        flows = {}
+        for src, dst, service_class, bandwidth, latency in table.tolist():
+            nodeA = node_names[src]
+            nodeB = node_names[dst]
+            flow_id = nodeA + nodeB + SERVICE_CLASSES[service_class]
+            flows[flow_id] = {
+                "_id": flow_id,
+                "node1": nodeA,
+                "node2": nodeB,
+                "bandwidth": bandwidth,
+                "latency": latency,
+                "jitter": 0,
+                "loss": 0
+            }
+
+        return flows
+
+    def get_flows_from_file(self, i):
+        """
+        Reads the i-th traffic file (or tensor sample) and returns its flows: every src-dst traffic value is boosted,
+        converted in Mbps and split into premium, assured and best effort flows.
+
+        Args:
+            i (int): index of the traffic file.
+
+        Returns:
+            [dict]: flows, indexed by flow id.
+        """
+
+        node_names, table = self.get_flow_table(i)
+
+        return self.get_flows_from_table(table, node_names)
 
     def get_flow(self, service_class, bandwidth, nodeA, nodeB):
         """[summary]
@@ -229,12 +605,23 @@ class TrafficGenerator():
 
         return performance_constraints
 
+    def route(self, flow):
+        """
+        Returns the path of 'flow' computed by the topology routing method (timed if instrumentation is enabled).
+        """
+
+        if self.instrumentation is None:
+            return self.topo.get_path(flow)
+
+        start = self.instrumentation.now()
+        path = self.topo.get_path(flow)
+        self.instrumentation.record_flow(flow, self.topo.routing_method, start)
+
+        return path
+
     def apply_flows(self):
 
-        # Bandwidth threshold: if two flows with equal source-destination are found between
-        # two time intervals, check their bandwidth
-        # If difference > threshold, then consider them as different flows
-        bw_delta_thrs = 100  # Mbps        
+        bw_delta_thrs = self.bw_delta_thrs
         if not self.old_path_archive:
 
             ## APPLY FLOWS ON NETWORK (THE NETWORK IS EMPTY)
@@ -245,7 +632,7 @@ class TrafficGenerator():
                 #node1 = flow["node1"]
                 #node2 = flow["node2"]
                 #flow_path = self.topo.get_shortest_path(node1, node2)
-                flow_path = self.topo.get_path(flow)
+                flow_path = self.route(flow)
                 self.new_path_archive.append((flow, flow_path))
                 self.topo.apply_service_on_network(flow, flow_path)
         
@@ -269,7 +656,7 @@ class TrafficGenerator():
                         # It's a new flow, discard the old one and route this one                 
                         self.topo.remove_service_from_network(old_entry[0], old_entry[1])
                         self.old_path_archive.remove(old_entry)
-                        flow_path = self.topo.get_path(flow)
+                        flow_path = self.route(flow)
                         self.new_path_archive.append((flow, flow_path))
                         self.topo.apply_service_on_network(flow, flow_path)
                     else:
@@ -278,7 +665,7 @@ class TrafficGenerator():
                         self.new_path_archive.append(old_entry)  
                 else:  
                     # It's a new flow, route it and log it
-                    flow_path = self.topo.get_path(flow)
+                    flow_path = self.route(flow)
                     self.new_path_archive.append((flow, flow_path))
                     self.topo.apply_service_on_network(flow, flow_path)
 
@@ -291,49 +678,102 @@ class TrafficGenerator():
 
         self.old_path_archive = self.new_path_archive
         self.new_path_archive = []
-        self.log_stats()
+
+    def apply_flow_table(self, table, node_names):
+        """
+        Delta-driven version of apply_flows: the flows of a new traffic interval are diffed against the
+        applied ones, in vectorized form, and classified as
+        * unchanged: applied with a bandwidth difference within bw_delta_thrs, kept as they are
+        * changed: bandwidth difference above bw_delta_thrs, removed and rerouted
+        * new: not applied, routed
+        * vanished: applied but not in the new interval (or on a faulty node), removed
+        Only changed and new flows are converted into service flows and routed; flows are routed in table order,
+        vanished flows are removed at the end, as in apply_flows.
+
+        Args:
+            table (np.ndarray): flow table, see build_flow_table.
+            node_names (list): node names, indexed by the 'src'/'dst' columns.
+        """
+
+        # Flows on faulty nodes are not considered
+        if self.topo.faulty_node_list:
+            faulty = np.isin(np.array(node_names), self.topo.faulty_node_list)
+            table = table[~(faulty[table['src']] | faulty[table['dst']])]
+
+        # Flow ids, as in get_flow
+        names = np.array(node_names, dtype=object)
+        classes = np.array(SERVICE_CLASSES, dtype=object)
+        new_ids = (names[table['src']] + names[table['dst']] + classes[table['service_class']]).astype(str)
+
+        # Applied flows
+        archive = np.empty(len(self.old_path_archive), dtype=object)
+        for k, entry in enumerate(self.old_path_archive):
+            archive[k] = entry
+        applied_ids = np.array([entry[0]['_id'] for entry in self.old_path_archive], dtype=str)
+        applied_bw = np.array([entry[0]['bandwidth'] for entry in self.old_path_archive], dtype=float)
+
+        ## DELTA STAGE
+        # matched[k] is the position in the archive of the k-th new flow (if found)
+        matched = np.zeros(len(new_ids), dtype=int)
+        found = np.zeros(len(new_ids), dtype=bool)
+        if len(applied_ids):
+            order = np.argsort(applied_ids)
+            pos = np.minimum(np.searchsorted(applied_ids, new_ids, sorter=order), len(order) - 1)
+            matched = order[pos]
+            found = applied_ids[matched] == new_ids
+        changed = found.copy()
+        changed[found] = np.abs(applied_bw[matched[found]] - table['bandwidth'][found]) > self.bw_delta_thrs
+        unchanged = found & ~changed
+        vanished = ~np.isin(applied_ids, new_ids[found])
+
+        new_archive = np.empty(len(new_ids), dtype=object)
+        if unchanged.any():
+            new_archive[unchanged] = archive[matched[unchanged]]
+
+        ## APPLY/MODIFY FLOWS ON NETWORK
+        to_route = np.flatnonzero(~unchanged)
+        flows = self.get_flows_from_table(table[to_route], node_names)
+        for row, flow in zip(to_route, flows.values()):
+            if changed[row]:
+                # It's a new flow, discard the old one and route this one
+                old_entry = archive[matched[row]]
+                self.topo.remove_service_from_network(old_entry[0], old_entry[1])
+            flow_path = self.route(flow)
+            new_archive[row] = (flow, flow_path)
+            self.topo.apply_service_on_network(flow, flow_path)
+
+        ## REMOVE OLD FLOWS FROM NETWORK
+        for entry in archive[vanished]:
+            self.topo.remove_service_from_network(entry[0], entry[1])
+
+        self.old_path_archive = new_archive.tolist()
+        self.new_path_archive = []
 
     def log_stats(self):
         """
-        Called at the end of every new flow cycle, log network wide stats
+        Called at the end of every iteration, log network wide stats
         * Network-wide energy consumption
         * Network-wide reliability score (max and mean)
         * # of SLA violation (premium and assured)
         * Time
         """ 
+        if self.instrumentation is not None:
+            log_start = self.instrumentation.now()
+
         max_rel, above_thresh = self.topo.get_reliability_score()
-        premium_lat = []
-        assured_lat = [] 
-        premium_violations = 0
-        assured_violations = 0
-
-
-        for f in self.old_path_archive:
-            if 'premium' in f[0]['_id']:
-                path_lat = []
-                bw_violated = False
-                for j in range(len(f[1])-1):
-                    link = self.topo.get_link_between_neighbors(f[1][j], f[1][j+1])
-                    path_lat.append(link.latency)
-                    if link.bandwidth_usage > 1:
-                        bw_violated = True
-                path_lat = np.mean(path_lat)
-                premium_lat.append(path_lat)
-                if path_lat > self.premium_thresh or bw_violated:
-                    premium_violations += 1
-
-            elif 'assured' in f[0]['_id']:
-                path_lat = []
-                bw_violated = False
-                for j in range(len(f[1])-1):
-                    link = self.topo.get_link_between_neighbors(f[1][j], f[1][j+1])
-                    path_lat.append(link.latency)
-                    if link.bandwidth_usage > 1:
-                        bw_violated = True
-                path_lat = np.mean(path_lat)
-                assured_lat.append(path_lat)
-                if path_lat > self.assured_thresh or bw_violated:
-                    assured_violations += 1
+
+        # Mean path latencies are cached by the topology when flows are applied;
+        # a flow violates its SLA if its latency exceeds the class threshold or any link on its path is above 100%
+        flow_ids = [f[0]['_id'] for f in self.old_path_archive]
+        premium = np.array(['premium' in f for f in flow_ids], dtype=bool)
+        assured = np.array(['assured' in f for f in flow_ids], dtype=bool) & ~premium
+        path_lat = self.topo.get_path_latencies(flow_ids)
+        bw_violated = self.topo.get_path_violations(flow_ids)
+
+        premium_lat = path_lat[premium]
+        assured_lat = path_lat[assured]
+        premium_violations = int(np.sum((premium_lat > self.premium_thresh) | bw_violated[premium]))
+        assured_violations = int(np.sum((assured_lat > self.assured_thresh) | bw_violated[assured]))
 
         self.log_cols = ['Routing algorithm', 'Power consumption [W]', 'Reliability score (Max)',\
                             'Reliability score (# above 60%)', 'Mean latency (premium) [ms]',\
@@ -345,9 +785,11 @@ class TrafficGenerator():
                    int(np.mean(premium_lat)), int(np.mean(assured_lat)), premium_violations, assured_violations, \
                    self.last_elapsed , self.topo.get_link_usages()], index = self.log_cols)
 
-        df = pd.read_csv(self.log_file_name)
-        df = df.append(row, ignore_index='True')
-        df.to_csv(self.log_file_name, mode='w', index=False)
+        # Append this row to the log file
+        row.to_frame().T.to_csv(self.log_file_name, mode='a', header=False, index=False)
+
+        if self.instrumentation is not None:
+            self.instrumentation.record_phase('log stats', log_start)
 
         return
 
@@ -366,6 +808,34 @@ class TrafficGenerator():
                 self.faults.append((fault_times[n], self.topo.nodes[faulty_nodes[n]].name))
         return
 
+def build_flow_table(matrix, traffic_boost, parts, latencies):
+    """
+    Vectorized flow generation: every src-dst traffic value is boosted, converted in Mbps
+    and split into one flow per service class.
+
+    Args:
+        matrix (np.ndarray): N x N traffic matrix [bps].
+        traffic_boost (float): bandwidth multiplier.
+        parts (list): share of the src-dst bandwidth assigned to each service class.
+        latencies (list): latency bound [ms] of each service class.
+
+    Returns:
+        [np.ndarray]: flow table (FLOW_DTYPE), ordered by src, dst and service class.
+    """
+
+    bw = traffic_boost * np.round(np.asarray(matrix, dtype=float) / 1000000, 0)  # Mbps
+    src, dst = np.nonzero(bw > 0)
+    n_classes = len(parts)
+
+    table = np.empty(len(src) * n_classes, dtype=FLOW_DTYPE)
+    table['src'] = np.repeat(src, n_classes)
+    table['dst'] = np.repeat(dst, n_classes)
+    table['service_class'] = np.tile(np.arange(n_classes), len(src))
+    table['bandwidth'] = np.round(np.outer(bw[src, dst], parts), 3).ravel()
+    table['latency'] = np.tile(latencies, len(src))
+
+    return table
+
 def read_from_json(json_path):
     """
     Returns data read from json file at found at 'json_path' location.
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.dont_write_bytecode
+import json
+import os
+import numpy as np
+
+TRAFFIC_FILE_SUFFIX = '_traffic_matrices.json'
+
+
+def read_from_json(json_path):
+    """
+    Returns data read from json file at found at 'json_path' location.
+
+    Arguments:
+        json_path {str} -- relative path of json file to be read.
+
+    Returns:
+        [dict] -- Dictionary with data read from json.
+    """
+
+    # Read data
+    with open(json_path, 'r') as json_file:
+        data = json.load(json_file)
+
+    return data
+
+def write_to_json(data, filename, json_path):
+    """
+    Write 'data' on json file named 'filename' at 'json_path' location.
+
+    Arguments:
+        data {dict} -- data to be written.
+        filename {str} -- name of file to be created/overwritten.
+        json_path {str} -- relative path of json file to be created/overwritten.
+    """
+
+    # Get the complete path
+    filepath = os.path.join(json_path, filename)
+
+    # Write data
+    with open(filepath + '.json', 'w+') as f:
+        json.dump(data, f, sort_keys=True, indent=4)
+
+def get_index_path(tensor_path):
+    # Location of the index (timestamps and node names) of a .npy tensor
+    return os.path.splitext(tensor_path)[0] + '_index.json'
+
+
+class TrafficTensor:
+
+    def __init__(self, matrices, timestamps, node_names):
+        """
+        Initialization Method of TrafficTensor object: a time series of traffic matrices packed in one array.
+
+        Arguments:
+            matrices {np.ndarray} -- T x N x N float32 array, matrices[t, i, j] is the traffic [bps]
+                from node_names[i] to node_names[j] at timestamps[t].
+            timestamps {list} -- T timestamps (strings, e.g. '2020-04-01 00:05:00').
+            node_names {list} -- N node names.
+        """
+
+        self.matrices = matrices
+        self.timestamps = [str(t) for t in timestamps]
+        self.node_names = [str(n) for n in node_names]
+        self.node_index = {name: i for i, name in enumerate(self.node_names)}
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @classmethod
+    def from_directory(cls, path, node_names=None):
+        """
+        Packs a directory of '<timestamp>_traffic_matrices.json' files (nested dicts, one per sample).
+
+        Arguments:
+            path {str} -- location of the traffic files.
+
+        Keyword Arguments:
+            node_names {list} -- node table; by default, the sorted names found in the files (default: {None}).
+
+        Returns:
+            [TrafficTensor] -- the packed time series, ordered as TrafficGenerator reads the files.
+        """
+
+        traffic_files = [f for f in os.listdir(path) if f.endswith('.json')]
+        traffic_files.sort(key=str.lower)
+        data = [read_from_json(os.path.join(path, f)) for f in traffic_files]
+
+        if node_names is None:
+            names = set()
+            for f in data:
+                names.update(f)
+                for src in f:
+                    names.update(f[src])
+            node_names = sorted(names)
+        node_index = {name: i for i, name in enumerate(node_names)}
+
+        matrices = np.zeros((len(data), len(node_names), len(node_names)), dtype=np.float32)
+        for t, f in enumerate(data):
+            for src in f:
+                row = matrices[t, node_index[src]]
+                for dst, value in f[src].items():
+                    row[node_index[dst]] = value
+
+        timestamps = [f[:-len(TRAFFIC_FILE_SUFFIX)] if f.endswith(TRAFFIC_FILE_SUFFIX) else os.path.splitext(f)[0] \
+                      for f in traffic_files]
+
+        return cls(matrices, timestamps, node_names)
+
+    @classmethod
+    def load(cls, tensor_path, mmap=True):
+        """
+        Reads a packed time series.
+
+        '.npy' tensors are memory-mapped (read-only) when 'mmap' is True, and their index is read from
+        the '<name>_index.json' file next to them; '.npz' archives hold tensor and index together,
+        but are read in memory.
+
+        Arguments:
+            tensor_path {str} -- location of the .npy/.npz file.
+
+        Keyword Arguments:
+            mmap {bool} -- memory-map .npy tensors (default: {True}).
+
+        Returns:
+            [TrafficTensor] -- the packed time series.
+        """
+
+        if tensor_path.endswith('.npz'):
+            with np.load(tensor_path, allow_pickle=False) as data:
+                return cls(data['matrices'], data['timestamps'].tolist(), data['node_names'].tolist())
+        elif tensor_path.endswith('.npy'):
+            index = read_from_json(get_index_path(tensor_path))
+            matrices = np.load(tensor_path, mmap_mode='r' if mmap else None, allow_pickle=False)
+            return cls(matrices, index['timestamps'], index['node_names'])
+        else:
+            raise Exception('*** {} IS NOT A TRAFFIC TENSOR (.npy/.npz) ***'.format(tensor_path))
+
+    def save(self, tensor_path):
+        """
+        Writes the time series to 'tensor_path' (.npy plus index file, or .npz).
+
+        Arguments:
+            tensor_path {str} -- destination file.
+        """
+
+        matrices = np.asarray(self.matrices, dtype=np.float32)
+        if tensor_path.endswith('.npz'):
+            np.savez(tensor_path, matrices=matrices, timestamps=np.array(self.timestamps, dtype=str), \
+                     node_names=np.array(self.node_names, dtype=str))
+        elif tensor_path.endswith('.npy'):
+            np.save(tensor_path, matrices)
+            index = {"timestamps": self.timestamps, "node_names": self.node_names}
+            index_path = get_index_path(tensor_path)
+            write_to_json(index, os.path.basename(index_path)[:-len('.json')], os.path.dirname(index_path))
+        else:
+            raise Exception('*** {} IS NOT A TRAFFIC TENSOR (.npy/.npz) ***'.format(tensor_path))
+
+    def get_traffic_matrix(self, t):
+        """
+        Returns the t-th traffic matrix in the layout of the JSON traffic files.
+
+        Arguments:
+            t {int} -- sample index.
+
+        Returns:
+            [dict] -- {src: {dst: traffic [bps]}}, self pairs excluded.
+        """
+
+        matrix = np.asarray(self.matrices[t], dtype=float)
+        return {src: {dst: matrix[i, j] for j, dst in enumerate(self.node_names) if j != i} \
+                for i, src in enumerate(self.node_names)}
+
+
+def pack_directory(path, tensor_path):
+    """
+    Converts the traffic files in 'path' into a single tensor file.
+
+    Arguments:
+        path {str} -- location of the traffic files.
+        tensor_path {str} -- destination file (.npy or .npz).
+
+    Returns:
+        [TrafficTensor] -- the packed time series.
+    """
+
+    tensor = TrafficTensor.from_directory(path)
+    tensor.save(tensor_path)
+
+    return tensor
+
+
+def main():
+
+    # Usage: python -m service_flows.traffic_tensor <traffic files dir> <tensor file (.npy|.npz)>
+    tensor = pack_directory(sys.argv[1], sys.argv[2])
+    print(" *** {} SAMPLES x {} NODES PACKED TO {} *** ".format(len(tensor), len(tensor.node_names), sys.argv[2]))
+
+
+if __name__ == "__main__":
+    main()
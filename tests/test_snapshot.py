@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.dont_write_bytecode
+import pytest
+from network_topologies.geant import Geant
+
+
+FLOWS = [('AT', 'DE'), ('DE', 'AT'), ('UK', 'IT')]
+
+
+@pytest.fixture
+def topo():
+    topo = Geant(routing_method='Dijkstra')
+    topo.autosave = False   # do not overwrite the GEANT database
+    return topo
+
+@pytest.fixture
+def flows(topo):
+    # (flow, path) applied on the topology
+    flows = []
+    for i, (src, dst) in enumerate(FLOWS):
+        flow = {'_id': 'f{}'.format(i), 'node1': src, 'node2': dst, 'bandwidth': 10.0}
+        path = topo.get_path(flow)
+        topo.apply_service_on_network(flow, path)
+        flows.append((flow, path))
+    return flows
+
+
+def test_shutdown_remove_commit(topo, flows):
+    node = flows[0][1][1]
+    snap = topo.snapshot()
+    disrupted = snap.shutdown_node(node)
+    assert 'f0' in disrupted
+    for flow, path in flows:
+        if flow['_id'] in disrupted:
+            snap.remove_service_from_network(flow, path)
+    loads = snap.get_link_loads()
+
+    snap.commit()
+
+    assert topo.get_one_node(node).status == 'off'
+    assert topo.get_link_loads() == pytest.approx(loads)
+    assert [f['_id'] for f in topo.current_flows] == [f['_id'] for f, _ in flows if f['_id'] not in disrupted]
+    assert topo.validate_link_state() == []
+
+def test_nested_shutdown(topo, flows):
+    path = flows[2][1]
+    flow = {'_id': 'g', 'node1': path[0], 'node2': path[-1], 'bandwidth': 5.0}
+    parent = topo.snapshot()
+    parent.apply_service_on_network(flow, path)
+    child = parent.snapshot()
+
+    # The flow applied on the parent snapshot is disrupted too
+    assert set(child.shutdown_node(path[1])) == {'f2', 'g'}
+    child.remove_service_from_network(flow, path)
+    child.commit()
+    assert parent.get_node_status(path[1]) == 'off'
+
+    parent.commit()
+    assert topo.get_one_node(path[1]).status == 'off'
+    assert 'g' not in [f['_id'] for f in topo.current_flows]
+    assert topo.validate_link_state() == []
+
+def test_failed_commit_applies_nothing(topo, flows):
+    flow, path = flows[0]
+    snap = topo.snapshot()
+    snap.apply_service_on_network({'_id': 'g', 'node1': path[0], 'node2': path[-1], 'bandwidth': 5.0}, path)
+    snap.remove_service_from_network({'_id': 'missing', 'bandwidth': 5.0}, path)
+    loads = topo.get_link_loads()
+
+    with pytest.raises(Exception):
+        snap.commit()
+
+    assert topo.get_link_loads() == pytest.approx(loads)
+    assert len(topo.current_flows) == len(flows)
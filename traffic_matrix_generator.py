@@ -1,14 +1,23 @@
 # -*- coding: utf-8 -*-
 import sys
 sys.dont_write_bytecode
+import argparse
+import hashlib
+import multiprocessing
 import os
 import numpy as np
 from network_topologies.geant import Geant
+from network_topologies.topology import Topology
+from service_flows.link_dataset import LinkDataset
+from service_flows.traffic_tensor import TrafficTensor, get_index_path
 from routing_algorithms.dijkstra import dijkstra
 from routing_algorithms.dijkstra import calculate_path
-from routing_algorithms.dijkstra import set_spt
-import csv
+from routing_algorithms.dijkstra import dijkstra_cost
 import json
+from scipy import sparse
+from scipy.sparse import csgraph
+from scipy.sparse.linalg import svds
+from scipy.optimize import minimize
 from scipy.optimize import nnls
 
 THIS_FILE_PATH = os.path.dirname(__file__)
@@ -16,18 +25,40 @@ TRAFFIC_MATRICES_PATH = os.path.join(THIS_FILE_PATH, 'service_flows', 'traffic_m
 if not os.path.exists(TRAFFIC_MATRICES_PATH):
     os.makedirs(TRAFFIC_MATRICES_PATH, exist_ok=True)
 DATASET_PATH = os.path.join(THIS_FILE_PATH, 'service_flows', 'dataset_geant')
+# Compact store of the solved traffic matrices (TrafficTensor) and record of what they were solved from
+STORE_PATH = os.path.join(THIS_FILE_PATH, 'service_flows', 'traffic_matrices_store')
+STORE_INDEX_NAME = 'index'
+MANIFEST_NAME = 'manifest'
 
-def main():
+# Per-process state of the batched estimator (see init_solver)
+_SOLVER = {}
 
-    # ****** TIME SETUP ******
-    timeline = get_timeline()
-    START = 0
-    STOP = len(timeline)
+def main():
 
+    parser = argparse.ArgumentParser(description='Estimate the traffic matrices (GEANT by default) from the link throughputs.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='solver processes')
+    parser.add_argument('--method', default=None, choices=SOLVER_METHODS, \
+                        help="'nnls' (exact active set), 'pgd' (warm-started projected gradient) or 'lbfgsb' " \
+                             "(warm-started L-BFGS-B); 'lbfgsb' with --sparse, 'nnls' otherwise by default")
+    parser.add_argument('--sparse', action='store_true', help='sparse coefficient matrix (large topologies)')
+    parser.add_argument('--topology', default='geant', help="'geant' or a compiled topology (folder or .npz, " \
+                        "see network_topologies/topology_compiler.py); other topologies need --store")
+    parser.add_argument('--incremental', action='store_true', \
+                        help='solve only the timestamps that are new or changed since the last run')
+    parser.add_argument('--store', default=None, help='read the link throughputs from a columnar store (.npz, ' \
+                        'see service_flows/link_dataset.py) instead of the CSV files')
+    parser.add_argument('--start', default=None, help="first timestamp (e.g. '2020-04-01 00:00:00')")
+    parser.add_argument('--stop', default=None, help='end timestamp (excluded)')
+    args = parser.parse_args()
+    method = args.method or ('lbfgsb' if args.sparse else 'nnls')
+
+
+    if args.topology != 'geant' and args.store is None:
+        raise Exception('*** THE LINK THROUGHPUTS OF {} MUST BE READ FROM A STORE (--store) ***'.format(args.topology))
 
     # ****** TOPOLOGY SETUP ******
-    topo = Geant()
-    set_spt(topo)
+    # The sparse formulation reads the SPTs from the predecessor matrix: no routing initialization (set_spt)
+    topo = build_topology(args.topology, None if args.sparse else 'Dijkstra')
 
     # Preliminary Definitions
     directed_links = topo.link_names
@@ -44,14 +75,44 @@ def main():
     # Constrained Optimization: Karush-Kuhn-Tucker Theorem (generalization of Lagrange Multiplier Method)
     # -----> min_x (|A x - b|^2) with x >= 0
 
-    coefficient_matrix = generate_coefficient_matrix(directed_links, traffic_directions, topo)  # A
-    A = np.array(coefficient_matrix)
+    if args.sparse:
+        A = generate_sparse_coefficient_matrix(directed_links, traffic_directions, topo, \
+                                               predecessors=get_spt_predecessors(topo))  # A
+    else:
+        coefficient_matrix = generate_coefficient_matrix(directed_links, traffic_directions, topo)  # A
+        A = np.array(coefficient_matrix)
+
+    # ****** INCREMENTAL SETUP ******
+    # A solution is valid as long as coefficient matrix (topology and SPT), solver and link throughputs are unchanged
+    model_hash = get_model_hash(A, directed_links, traffic_directions, method)
+    dataset_hashes = get_dataset_hashes(args.store)
+    manifest = read_manifest() if args.incremental else {}
+    if manifest.get("model") != model_hash or not read_store_index():
+        manifest = {}
+    if manifest.get("dataset") == dataset_hashes and manifest.get("range") == [args.start, args.stop]:
+        print(" *** TRAFFIC MATRICES UP TO DATE *** ")
+        return
+
+    # ****** TIME SETUP ******
+    # CSV files or store: the same dataset gives the same b (see load_link_throughputs)
+    dataset = None if args.store is None else LinkDataset.load(args.store)
+    timeline, B = load_link_throughputs(directed_links, dataset, args.start, args.stop)  # b for every t
+    START = 0
+    STOP = len(B)
+
+    solved = manifest.get("timestamps", {})
+    row_hashes = {str(timeline[t]): hash_array(B[t]) for t in range(START, STOP)}
+    todo = [t for t in range(START, STOP) if solved.get(str(timeline[t])) != row_hashes[str(timeline[t])]]
+    print(" *** {} TIMESTAMPS, {} TO SOLVE *** ".format(STOP - START, len(todo)))
+
+    # x for every t to solve, solved in parallel
+    X = solve_traffic_matrices(A, B[todo], workers=args.workers, method=method)
 
-    mae_dict = {}
-    for t in range(START, STOP):
-        constants = get_link_throughputs(directed_links, t)  # b
-        b = [elem[0] for elem in constants]  # b
-        solution, _ = nnls(A, b)  # x
+    mae_path = os.path.join(THIS_FILE_PATH, 'traffic_matrices_mae.json')
+    mae_dict = read_from_json(mae_path) if solved and os.path.exists(mae_path) else {}
+    for k, t in enumerate(todo):
+        b = B[t]  # b
+        solution = X[k]  # x
         post_process_solution(solution)  # x
         
         mae = round(np.mean(abs(b-A.dot(solution)))/1000000,3)  # Mean Absolute Error expressed in Mbps
@@ -66,29 +127,29 @@ def main():
     
     write_to_json(mae_dict, "traffic_matrices_mae", THIS_FILE_PATH)
 
+    # Record the solved timestamps
+    update_store([str(timeline[t]) for t in todo], X, topo.node_names, reset=not solved)
+    solved.update({str(timeline[t]): row_hashes[str(timeline[t])] for t in todo})
+    write_manifest({"model": model_hash, "dataset": dataset_hashes, "range": [args.start, args.stop], "timestamps": solved})
 
-def get_timeline():
+
+def build_topology(topology, routing_method):
     """
-    This function returns the timeline, i.e. time axis data.
+    Returns the topology whose traffic matrices are estimated.
 
-    Returns:
-        [List] -- time axis data.
+    Arguments:
+        topology {str} -- 'geant' or the location of a compiled topology (folder or .npz).
+        routing_method {str} -- Name of the routing method, None for no routing.
     """
 
-    # init timeline
-    timeline = []
+    if topology == 'geant':
+        topo = Geant(routing_method=routing_method)
+    else:
+        topo = Topology.from_compiled(topology, routing_method=routing_method)
+    # The topology DB must not be overwritten
+    topo.autosave = False
 
-    # Import one file @ DATASET_PATH (the "anchor_file") 
-    files = os.listdir(DATASET_PATH)
-    time_anchor_file_name = files[0]
-    time_anchor_path = os.path.join(DATASET_PATH, time_anchor_file_name)
-    time_anchor_data = import_csv(time_anchor_path)
-    
-    # Extract time sampling instants to build timeline
-    for i in range(1,len(time_anchor_data)):  # ..skip first row (header)
-         timeline.append(time_anchor_data[i][0])
-    
-    return timeline  
+    return topo
 
 def generate_traffic_directions(nodes):
     """
@@ -141,112 +202,453 @@ def generate_coefficient_matrix(rows, columns, topo):
     
     return coefficient_matrix
 
-def get_link_throughputs(links, t):
+def get_spt_predecessors(topo):
+    """
+    Returns the Shortest Path Trees of every node as a predecessor matrix, computed on the Dijkstra cost matrix
+    of the topology with scipy's compiled Dijkstra (set_spt enumerates all the ECMPs and does not scale).
+    Among equal-cost paths the chosen one may differ from set_spt's.
+
+    Arguments:
+        topo {Topology} -- Network Topology object.
+
+    Returns:
+        [np.ndarray] -- N x N matrix (nodes ordered as topo.node_names): predecessors[i][j] is the node before j
+        on the path from i to j, -9999 if j is i or is unreachable.
     """
-    This functions returns the vector of current topology links throughput (bps).
+
+    # Cost matrix of the active links (as topo.dijkstra_cost_matrix, without its N x N loops)
+    node_index = {name: i for i, name in enumerate(topo.node_names)}
+    links = [link for link in topo.links if link.status == 'on']
+    rows = [node_index[link.node1] for link in links]
+    columns = [node_index[link.node2] for link in links]
+    costs = [dijkstra_cost(link.total_bandwidth) for link in links]
+    n = len(topo.node_names)
+    cost_matrix = sparse.csr_matrix((costs, (rows, columns)), shape=(n, n))
+    _, predecessors = csgraph.dijkstra(cost_matrix, directed=True, return_predecessors=True)
+
+    return predecessors
+
+def generate_sparse_coefficient_matrix(rows, columns, topo, predecessors=None):
+    """
+    Sparse version of generate_coefficient_matrix: the nonzeros are read from the Shortest Path Trees,
+    so memory grows with the total length of the shortest paths instead of L x N(N-1).
+
+    Arguments:
+        rows {List} -- List of topology link names.
+        columns {List} -- List of traffic directions.
+        topo {Topology} -- Network Topology object.
+
+    Keyword Arguments:
+        predecessors {np.ndarray} -- SPT predecessor matrix (see get_spt_predecessors); if None, the SPT
+            of the nodes (set_spt) is used and the result equals generate_coefficient_matrix (default: {None}).
+
+    Returns:
+        [sparse.csr_matrix] -- binary coefficient matrix.
+    """
+
+    row_index = {link: i for i, link in enumerate(rows)}
+    node_index = {name: i for i, name in enumerate(topo.node_names)}
+    node_names = topo.node_names
+    row_ids, col_ids = [], []
+
+    for col, service_name in enumerate(columns):
+        src = service_name[:len(service_name)//2]
+        if predecessors is None:
+            service_path = topo.get_one_node(src).spt.get(service_name)
+            if service_path:
+                for i in range(len(service_path)-1):
+                    row_ids.append(row_index[service_path[i] + service_path[i+1]])
+                    col_ids.append(col)
+        else:
+            # Walk the SPT of src back from dst
+            src_i = node_index[src]
+            node_i = node_index[service_name[len(service_name)//2:]]
+            pred_i = predecessors[src_i][node_i]
+            while pred_i >= 0:
+                row_ids.append(row_index[node_names[pred_i] + node_names[node_i]])
+                col_ids.append(col)
+                node_i, pred_i = pred_i, predecessors[src_i][pred_i]
+
+    data = np.ones(len(row_ids))
+    return sparse.csr_matrix((data, (row_ids, col_ids)), shape=(len(rows), len(columns)))
+
+def load_link_throughputs(links, dataset=None, start=None, stop=None):
+    """
+    This function returns the throughputs (bps) of all the topology links between two timestamps,
+    read from a columnar link dataset: only the 'links' columns and the [start, stop) range are used.
+
+    Samples are aligned by timestamp and the directions of every link are the ones named in the heading
+    of its link file (see service_flows/data_processor.py), whether the dataset is read from the CSV files
+    or from a store.
 
     Arguments:
         links {List} -- List of topology link names.
-        t {int} -- Time index.
-    
+
+    Keyword Arguments:
+        dataset {LinkDataset} -- link throughput dataset (see service_flows/link_dataset.py),
+            the CSV files @ DATASET_PATH if None (default: {None}).
+        start {str} -- first timestamp, from the beginning if None (default: {None}).
+        stop {str} -- end timestamp (excluded), to the end if None (default: {None}).
+
     Returns:
-        [List] -- Vector of current topology links throughputs.
-    """
-
-    # init link_throughputs
-    link_throughputs = np.zeros((len(links),1))
-
-    link_ids = {
-        "BENL": "ams-bru",
-        "DENL": "ams-fra",
-        "DUNL": "ams-ham",
-        "NLUK": "ams-lon",
-        "GCGR": "ath-ath2",
-        "GRIT": "ath-mil",
-        "ATGC": "ath2-vie",
-        "HUSK": "bra-bud",
-        "ATSK": "bra-vie",
-        "BEUK": "bru-lon",
-        "HURO": "buc-bud",
-        "BGRO": "buc-sof",
-        "HUSI": "bud-lju",
-        "CZHU": "bud-pra",
-        "ATHU": "bud-vie",
-        "HRHU": "bud-zag",
-        "IEIR": "dub-dub",
-        "IEUK": "dub-lon",
-        "IRUI": "dub2-lon2",
-        "CHDE": "FRA-GEN",
-        "DEDU": "fra-ham",
-        "DEPL": "fra-poz",
-        "CZDE": "FRA-PRA",
-        "CHES": "gen-mad",
-        "CHFN": "gen-mar",
-        "CHIT": "GEN-MIL2",
-        "CHFR": "GEN-PAR",
-        "DUEE": "ham-tal",
-        "LNLT": "kau-kau",
-        "LTPL": "kau-poz",
-        "LNLV": "kau-rig",
-        "PRPT": "lis-lis",
-        "PTUK": "lis-lon",
-        "ESPR": "lis-mad",
-        "ITSI": "LJU-MIL2",
-        "UIUK": "lon-lon2",
-        "FRUI": "lon2-par",
-        "ESFR": "mad-par",
-        "ITFN": "mar-mil2",
-        "ATIT": "MIL2-VIE",
-        "ATPL": "poz-vie",
-        "ATCZ": "PRA-VIE",
-        "ETLV": "rig-tal",
-        "ATBG": "sof-vie",
-        "EEET": "tal-tal",
-        "ATHR": "vie-zag"
-    }
-
-    # DATASET FILES
-    files = os.listdir(DATASET_PATH)
-
-    for link in link_ids:
-        link_id = link_ids[link]
-        for f in files:
-            if link_id in f:
-                # Import Data
-                csvfile = os.path.join(DATASET_PATH, f)
-                csvdata = import_csv(csvfile)
-
-                # Find link directions
-                if csvdata[0][1] == '{}'.format(link_id):
-                    straight_col = 1
-                    reverse_col = 3
-                else:
-                    straight_col = 3
-                    reverse_col = 1
-                
-                # Remove header
-                csvdata.pop(0)
-
-                # Get link directions data
-                straight_data = csvdata[t][straight_col]  
-                reverse_data = csvdata[t][reverse_col]
-
-                # Fill link_throughputs
-                straight_link_index = links.index(link)
-                knil = link[len(link)//2:] + link[:len(link)//2]
-                reverse_link_index = links.index(knil)
-                link_throughputs[straight_link_index][0] = straight_data
-                link_throughputs[reverse_link_index][0] = reverse_data
-
-    return link_throughputs
-
-def import_csv(csvfilename):
-    data = []
-    with open(csvfilename, "r", encoding="utf-8", errors="ignore") as scraped:
-        reader = csv.reader(scraped, delimiter=',')
-        for row in reader:
-            if row:  # avoid blank lines
-                data.append(row)
+        [tuple] -- (timeline, T x L matrix of link throughputs, columns ordered as 'links'), restricted
+        to the timestamps at which every link has a sample.
+    """
+
+    if dataset is None:
+        dataset = LinkDataset.from_directory(DATASET_PATH)
+
+    timestamps = dataset.get_timestamps(start, stop)
+    B = dataset.get_links(links, start, stop)
+    complete = np.isfinite(B).all(axis=1)
+
+    return [t for t, c in zip(timestamps, complete) if c], B[complete]
+
+# ************ BATCHED ESTIMATION ************
+
+SOLVER_METHODS = ['nnls', 'pgd', 'lbfgsb']
+
+def init_solver(A, method):
+    """
+    Sets the solver state of the current process: A is constant, so it is passed (and preprocessed) once per process.
+
+    Arguments:
+        A {np.ndarray|sparse.csr_matrix} -- coefficient matrix.
+        method {str} -- 'nnls', 'pgd' or 'lbfgsb'.
+    """
+
+    _SOLVER.clear()
+    _SOLVER['A'] = A
+    _SOLVER['method'] = method
+    if method == 'pgd':
+        # Lipschitz constant of the gradient of 1/2 |A x - b|^2
+        if sparse.issparse(A):
+            _SOLVER['L'] = svds(A, k=1, return_singular_vectors=False)[0]**2
+        else:
+            _SOLVER['L'] = np.linalg.norm(A, 2)**2
+        # The gradient A^T (A x - b) is cheaper as AtA x - Atb only when A has more rows than columns
+        _SOLVER['AtA'] = A.T.dot(A) if A.shape[0] >= A.shape[1] else None
+    elif method == 'lbfgsb':
+        _SOLVER['At'] = A.T.tocsr() if sparse.issparse(A) else A.T
+
+def projected_gradient_nnls(A, b, x0, L, AtA=None, tol=1e-7, max_iter=5000):
+    """
+    Solves min_x (|A x - b|^2) with x >= 0 by accelerated projected gradient (FISTA), starting from 'x0'.
+
+    The residual A x - b of the minimum is unique, the minimizer x is not (A has fewer rows than columns):
+    the result has the MAE of nnls within tolerance, but it is a different (denser) traffic matrix.
+
+    Arguments:
+        A {np.ndarray} -- coefficient matrix.
+        b {np.ndarray} -- known terms.
+        x0 {np.ndarray} -- starting point (e.g. the solution at the previous time index).
+        L {float} -- Lipschitz constant of the gradient, i.e. the largest eigenvalue of A^T A.
+
+    Keyword Arguments:
+        AtA {np.ndarray} -- precomputed A^T A, used for the gradient when given (default: {None}).
+        tol {float} -- stop when the relative step is below 'tol' (default: {1e-7}).
+        max_iter {int} -- maximum number of iterations (default: {5000}).
+
+    Returns:
+        [np.ndarray] -- the solution x.
+    """
+
+    Atb = A.T.dot(b) if AtA is not None else None
+    x = np.maximum(x0, 0)
+    y = x.copy()
+    k = 1.0
+
+    for _ in range(max_iter):
+        gradient = AtA.dot(y) - Atb if AtA is not None else A.T.dot(A.dot(y) - b)
+        x_next = np.maximum(y - gradient / L, 0)
+        step = x_next - x
+        k_next = (1 + np.sqrt(1 + 4 * k * k)) / 2
+        y = x_next + ((k - 1) / k_next) * step
+        x, k = x_next, k_next
+        if np.linalg.norm(step) <= tol * max(1.0, np.linalg.norm(x)):
+            break
+
+    return x
+
+def lbfgsb_nnls(A, b, x0, At=None, tol=1e-12, max_iter=15000):
+    """
+    Solves min_x (|A x - b|^2) with x >= 0 by L-BFGS-B (bounds x >= 0), starting from 'x0'.
+    Only products with A and A^T are needed, so A can be a (large) sparse matrix.
+
+    As for projected_gradient_nnls, the result has the MAE of nnls within tolerance, not the same x.
+
+    Arguments:
+        A {np.ndarray|sparse.csr_matrix} -- coefficient matrix.
+        b {np.ndarray} -- known terms.
+        x0 {np.ndarray} -- starting point (e.g. the solution at the previous time index).
+
+    Keyword Arguments:
+        At {np.ndarray|sparse.csr_matrix} -- A^T, precomputed (default: {None}).
+        tol {float} -- relative reduction of the objective at which the iteration stops (default: {1e-12}).
+        max_iter {int} -- maximum number of iterations (default: {15000}).
+
+    Returns:
+        [np.ndarray] -- the solution x.
+    """
+
+    At = A.T if At is None else At
+    # Work in units of max(b): b is in bps, the objective would be ~1e18 otherwise
+    scale = max(np.max(np.abs(b)), 1.0)
+    b = b / scale
+
+    def objective(x):
+        residual = A.dot(x) - b
+        return 0.5 * residual.dot(residual), At.dot(residual)
+
+    result = minimize(objective, np.maximum(x0, 0) / scale, jac=True, method='L-BFGS-B', \
+                      bounds=[(0, None)] * A.shape[1], \
+                      options={'maxiter': max_iter, 'maxfun': max_iter, 'ftol': tol, 'gtol': 1e-10})
+
+    return result.x * scale
+
+def solve_chunk(B):
+    """
+    Solves the linear systems A x = b (x >= 0) for the consecutive time indexes (rows) of 'B',
+    with the solver state of the current process (see init_solver).
+
+    Returns:
+        [np.ndarray] -- one solution per row of 'B'.
+    """
+
+    A = _SOLVER['A']
+    X = np.zeros((len(B), A.shape[1]))
+    x = np.zeros(A.shape[1])
+    for t in range(len(B)):
+        # Consecutive b vectors are close: iterative solvers warm start from the previous solution
+        if _SOLVER['method'] == 'nnls':
+            X[t], _ = nnls(A, B[t])
+        elif _SOLVER['method'] == 'pgd':
+            x = projected_gradient_nnls(A, B[t], x, _SOLVER['L'], _SOLVER['AtA'])
+            X[t] = x
+        else:
+            x = lbfgsb_nnls(A, B[t], x, _SOLVER['At'])
+            X[t] = x
+    return X
+
+def solve_traffic_matrices(A, B, workers=None, method='nnls', chunks_per_worker=4):
+    """
+    Solves min_x (|A x - b|^2) with x >= 0 for every row b of 'B' on a pool of 'workers' processes.
+
+    The time indexes are split in contiguous chunks, so that the warm-started solver ('pgd') starts every
+    system but the first of a chunk from the solution of the previous time index.
+    With method 'nnls' the solutions are the ones of scipy.optimize.nnls, whatever the number of workers.
+
+    'nnls' needs a dense A; 'pgd' and 'lbfgsb' also accept a sparse one (see generate_sparse_coefficient_matrix).
+
+    Arguments:
+        A {np.ndarray|sparse.csr_matrix} -- coefficient matrix.
+        B {np.ndarray} -- T x L matrix of known terms (one row per time index).
+
+    Keyword Arguments:
+        workers {int} -- number of processes, all the cores by default (default: {None}).
+        method {str} -- 'nnls' (exact active set), 'pgd' (warm-started projected gradient)
+            or 'lbfgsb' (warm-started L-BFGS-B) (default: {'nnls'}).
+        chunks_per_worker {int} -- chunks per process, for load balancing (default: {4}).
+
+    Returns:
+        [np.ndarray] -- T x N matrix of solutions (one row per time index).
+    """
+
+    if method not in SOLVER_METHODS:
+        raise Exception('*** UNKNOWN SOLVER METHOD {} ***'.format(method))
+    if sparse.issparse(A):
+        if method == 'nnls':
+            raise Exception("*** SOLVER METHOD 'nnls' NEEDS A DENSE COEFFICIENT MATRIX ***")
+        A = sparse.csr_matrix(A, dtype=float)
+    else:
+        A = np.asarray(A, dtype=float)
+    B = np.asarray(B, dtype=float)
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(B)))
+
+    if workers == 1:
+        init_solver(A, method)
+        return solve_chunk(B)
+
+    n_chunks = min(len(B), workers * chunks_per_worker)
+    chunks = np.array_split(B, n_chunks)
+    with multiprocessing.Pool(processes=workers, initializer=init_solver, initargs=(A, method)) as pool:
+        solutions = pool.map(solve_chunk, chunks, chunksize=1)
+
+    return np.vstack(solutions)
+
+# ************ INCREMENTAL REGENERATION ************
+
+def hash_array(array):
+    # Digest of the values of a numpy array
+    return hashlib.sha1(np.ascontiguousarray(array).tobytes()).hexdigest()
+
+def hash_file(file_path, block_size=1<<20):
+    # Digest of the content of a file
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def get_dataset_hashes(store_path=None):
+    """
+    Returns the digest of every dataset file (or of the columnar store at 'store_path', if given).
+
+    Returns:
+        [dict] -- {file name: sha1 of its content}.
+    """
+
+    if store_path is not None:
+        return {os.path.basename(store_path): hash_file(store_path)}
+    return {f: hash_file(os.path.join(DATASET_PATH, f)) for f in sorted(os.listdir(DATASET_PATH))}
+
+def get_model_hash(A, links, traffic_directions, method):
+    """
+    Returns the digest of everything but the link throughputs the solutions depend on:
+    the coefficient matrix (i.e. topology and SPT), its row and column labels and the solver method.
+    """
+
+    digest = hashlib.sha1()
+    if sparse.issparse(A):
+        A = sparse.csr_matrix(A, dtype=float)
+        A.sum_duplicates()  # canonical format (sorted indices)
+        for array in (A.indptr, A.indices, A.data):
+            digest.update(np.ascontiguousarray(array).tobytes())
+    else:
+        digest.update(np.ascontiguousarray(A, dtype=float).tobytes())
+    digest.update(json.dumps([list(links), list(traffic_directions), method]).encode('utf-8'))
+    return digest.hexdigest()
+
+def read_manifest():
+    """
+    Returns the record of the last run (empty if there is none).
+
+    Returns:
+        [dict] -- {"model": model hash, "dataset": {file name: hash}, "range": [start, stop] of the last run,
+        "timestamps": {timestamp: hash of b}}.
+    """
+
+    manifest_path = os.path.join(STORE_PATH, MANIFEST_NAME + '.json')
+    if not os.path.exists(manifest_path):
+        return {}
+    return read_from_json(manifest_path)
+
+def write_manifest(manifest):
+    os.makedirs(STORE_PATH, exist_ok=True)
+    write_to_json(manifest, MANIFEST_NAME, STORE_PATH)
+
+def read_store_index():
+    """
+    Returns the index of the compact store (empty if there is none).
+
+    Returns:
+        [dict] -- {"node_names": node names, "chunks": {chunk name: timestamps, in the chunk order}}.
+    """
+
+    index_path = os.path.join(STORE_PATH, STORE_INDEX_NAME + '.json')
+    if not os.path.exists(index_path):
+        return {}
+    return read_from_json(index_path)
+
+def get_chunk_path(chunk):
+    return os.path.join(STORE_PATH, chunk + '.npy')
+
+def update_store(timestamps, solutions, node_names, reset=False):
+    """
+    Adds the traffic matrices of 'timestamps' to the compact store, a sequence of chunks (one per run,
+    each a TrafficTensor, see service_flows/traffic_tensor.py) listed in the store index.
+
+    New timestamps are appended as a new chunk; the matrices of timestamps already stored are overwritten
+    in place (memory-mapped) in their chunk. No other chunk is read or written.
+
+    Arguments:
+        timestamps {list} -- timestamps of the solutions.
+        solutions {np.ndarray} -- one (post-processed) solution per timestamp, ordered as generate_traffic_directions.
+        node_names {list} -- topology node names.
+
+    Keyword Arguments:
+        reset {bool} -- discard the stored matrices (default: {False}).
+    """
+
+    n = len(node_names)
+    off_diagonal = ~np.eye(n, dtype=bool)  # row-major order of the off-diagonal entries = traffic directions
+
+    def get_matrices(positions):
+        matrices = np.zeros((len(positions), n, n), dtype=np.float32)
+        matrices[:, off_diagonal] = np.asarray(solutions)[positions]
+        return matrices
+
+    index = {} if reset else read_store_index()
+    if index.get("node_names") != list(node_names):
+        for chunk in read_store_index().get("chunks", {}):
+            for path in (get_chunk_path(chunk), get_index_path(get_chunk_path(chunk))):
+                if os.path.exists(path):
+                    os.remove(path)
+        index = {"node_names": list(node_names), "chunks": {}}
+
+    stored = {timestamp: (chunk, i) for chunk, chunk_timestamps in index["chunks"].items() \
+              for i, timestamp in enumerate(chunk_timestamps)}
+    new = [k for k, timestamp in enumerate(timestamps) if timestamp not in stored]
+    changed = {}  # chunk -> [(position in the chunk, position in solutions)]
+    for k, timestamp in enumerate(timestamps):
+        if timestamp in stored:
+            chunk, i = stored[timestamp]
+            changed.setdefault(chunk, []).append((i, k))
+
+    # Stored timestamps: overwrite in place
+    for chunk, positions in changed.items():
+        matrices = np.load(get_chunk_path(chunk), mmap_mode='r+', allow_pickle=False)
+        matrices[[i for i, _ in positions]] = get_matrices([k for _, k in positions])
+        matrices.flush()
+        del matrices
+
+    # New timestamps: append a chunk
+    if new:
+        os.makedirs(STORE_PATH, exist_ok=True)
+        chunk = 'traffic_matrices_{:05d}'.format(len(index["chunks"]))  # chunks are never removed one by one
+        chunk_timestamps = [timestamps[k] for k in new]
+        TrafficTensor(get_matrices(new), chunk_timestamps, node_names).save(get_chunk_path(chunk))
+        index["chunks"][chunk] = chunk_timestamps
+
+    if new or changed or reset:
+        os.makedirs(STORE_PATH, exist_ok=True)
+        write_to_json(index, STORE_INDEX_NAME, STORE_PATH)
+
+def load_store():
+    """
+    Returns all the stored traffic matrices (None if the store is empty).
+
+    Returns:
+        [TrafficTensor] -- traffic matrices of every stored timestamp, ordered by timestamp.
+    """
+
+    index = read_store_index()
+    if not index.get("chunks"):
+        return None
+
+    chunks = [TrafficTensor.load(get_chunk_path(chunk)) for chunk in index["chunks"]]
+    timestamps = [timestamp for tensor in chunks for timestamp in tensor.timestamps]
+    order = np.argsort(timestamps, kind='stable')
+    matrices = np.concatenate([tensor.matrices for tensor in chunks])[order]
+
+    return TrafficTensor(matrices, [timestamps[i] for i in order], index["node_names"])
+
+def read_from_json(json_path):
+    """
+    Returns data read from json file at found at 'json_path' location.
+
+    Arguments:
+        json_path {str} -- relative path of json file to be read.
+
+    Returns:
+        [dict] -- Dictionary with data read from json.
+    """
+
+    # Read data
+    with open(json_path, 'r') as json_file:
+        data = json.load(json_file)
+
     return data
 
 def write_to_json(data, filename, json_path):
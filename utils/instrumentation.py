@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.dont_write_bytecode
+import json
+import time
+import numpy as np
+import pandas as pd
+
+PERCENTILES = [50, 90, 99]
+
+
+class Instrumentation:
+
+    def __init__(self):
+        """
+        Initialization Method of Instrumentation object: records per-iteration phase durations,
+        per-flow routing latencies and (for MORA) generations run and evaluations performed.
+
+        Instrumentation is enabled by passing this object to a TrafficGenerator (which attaches it to the topology);
+        when no Instrumentation object is set, the instrumented code only checks an attribute against None.
+        """
+
+        self.iteration = None   # current iteration, set by TrafficGenerator
+        self.phase_records = [] # (iteration, phase, duration [s])
+        self.flow_records = []  # (iteration, flow id, routing method, service class, duration [s], generations, evaluations)
+        self.mora_counts = None # (generations, evaluations) of the flow being routed, set by MORA
+
+    @staticmethod
+    def now():
+        return time.perf_counter()
+
+    # ************ RECORD ************
+
+    def record_phase(self, phase, start):
+        """
+        Records a phase of the current iteration, started at 'start' (see now).
+        """
+
+        self.phase_records.append((self.iteration, phase, time.perf_counter() - start))
+
+    def record_flow(self, flow, routing_method, start):
+        """
+        Records the routing of 'flow', started at 'start' (see now), with the MORA counts recorded meanwhile (if any).
+        """
+
+        duration = time.perf_counter() - start
+        service_class = flow['_id'][len(flow['node1']) + len(flow['node2']):]
+        generations, evaluations = self.mora_counts if self.mora_counts is not None else (np.nan, np.nan)
+        self.mora_counts = None
+        self.flow_records.append((self.iteration, flow['_id'], routing_method, service_class, duration, generations, evaluations))
+
+    def record_mora(self, flow, generations, evaluations):
+        """
+        Records the generations run and the individuals evaluated by MORA to route 'flow';
+        they are stored with the next record_flow, i.e. with the routing call that ran MORA.
+        """
+
+        self.mora_counts = (generations, evaluations)
+
+    # ************ QUERY ************
+
+    def phases(self):
+        """
+        Returns the recorded phase durations [s].
+
+        Returns:
+            [pd.DataFrame]: one row per (iteration, phase).
+        """
+
+        return pd.DataFrame(self.phase_records, columns=['iteration', 'phase', 'duration'])
+
+    def flows(self):
+        """
+        Returns the recorded flow routing latencies [s].
+
+        Returns:
+            [pd.DataFrame]: one row per routed flow; 'generations' and 'evaluations' are NaN unless routed by MORA.
+        """
+
+        return pd.DataFrame(self.flow_records, columns=['iteration', 'flow', 'routing_method', 'service_class', 'duration',
+                                                       'generations', 'evaluations'])
+
+    def slowest_flows(self, n=10):
+        """
+        Returns the 'n' flows that took longest to route.
+        """
+
+        return self.flows().nlargest(n, 'duration')
+
+    def summary(self):
+        """
+        Returns count, mean, percentiles and max of the durations [s], per phase and per (routing method, service class).
+
+        Returns:
+            [dict]: {'phases': {phase: stats}, 'flows': {'<routing method>/<service class>': stats}}.
+        """
+
+        summary = {'phases': {}, 'flows': {}}
+        for phase, group in self.phases().groupby('phase'):
+            summary['phases'][phase] = get_stats(group['duration'].values)
+        for (method, service_class), group in self.flows().groupby(['routing_method', 'service_class']):
+            stats = get_stats(group['duration'].values)
+            if group['evaluations'].notna().any():
+                stats['mean_generations'] = float(group['generations'].mean())
+                stats['mean_evaluations'] = float(group['evaluations'].mean())
+            summary['flows']['{}/{}'.format(method, service_class)] = stats
+
+        return summary
+
+    def export(self, json_path, bins=20):
+        """
+        Writes summary and log-spaced histograms of the recorded durations to 'json_path'.
+        """
+
+        data = self.summary()
+        data['histograms'] = {}
+        for phase, group in self.phases().groupby('phase'):
+            data['histograms']['phase/' + phase] = get_histogram(group['duration'].values, bins)
+        for (method, service_class), group in self.flows().groupby(['routing_method', 'service_class']):
+            data['histograms']['flow/{}/{}'.format(method, service_class)] = get_histogram(group['duration'].values, bins)
+
+        with open(json_path, 'w+') as f:
+            json.dump(data, f, sort_keys=True, indent=4)
+
+
+def get_stats(durations):
+    stats = {'count': int(len(durations)), 'mean': float(np.mean(durations)), 'max': float(np.max(durations))}
+    for p, value in zip(PERCENTILES, np.percentile(durations, PERCENTILES)):
+        stats['p{}'.format(p)] = float(value)
+    return stats
+
+def get_histogram(durations, bins):
+    low = max(np.min(durations), 1e-7)
+    high = max(np.max(durations), low * 1.01)
+    counts, edges = np.histogram(np.clip(durations, low, high), bins=np.geomspace(low, high, bins + 1))
+    return {'counts': counts.tolist(), 'edges': edges.tolist()}